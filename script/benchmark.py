@@ -0,0 +1,472 @@
+#!/usr/bin/ python
+'''
+python3 script
+benchmark suite for the realtime solver
+
+runs the versioned matrix of benchmarkMatrix.json (domain x subdomain x
+commit algorithm x lookahead x instance, repeated), one run at a time,
+records wall time, lookahead cpu time, nodes expanded/generated and peak
+rss of every run, and compares them against a stored baseline per matrix
+cell with a two sided wilcoxon signed-rank test on the instances, each the
+median over its repeats. a run the baseline solved and that no longer
+solves counts as a regression as well, and so does a cell with too few
+instances solved in both to ever reach the significance level.
+
+eg:
+python benchmark.py -o benchmarks/before.json
+python benchmark.py -o benchmarks/after.json -b benchmarks/before.json
+'''
+
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from json.decoder import JSONDecodeError
+from subprocess import Popen, DEVNULL
+from threading import Timer
+
+researchHome = "/home/aifs1/gu/phd/research/workingPaper"
+
+# metrics compared against the baseline, all of them lower is better
+comparedMetrics = ["wallTime", "lookaheadCpuTime", "peakRss",
+                   "nodeExpanded", "nodeGenerated"]
+
+
+def parseArugments():
+
+    parser = argparse.ArgumentParser(description='benchmark')
+
+    parser.add_argument(
+        '-m',
+        action='store',
+        dest='matrix',
+        help='benchmark matrix (default benchmarkMatrix.json next to this \
+              script)',
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "benchmarkMatrix.json"))
+
+    parser.add_argument(
+        '-x',
+        action='store',
+        dest='solver',
+        help='realtime solver binary',
+        default=researchHome + "/metareasoning/build_release/bin/realtimeSolver")
+
+    parser.add_argument(
+        '-w',
+        action='store',
+        dest='worlds',
+        help='instance root directory',
+        default=researchHome + "/realtime-nancy/worlds")
+
+    parser.add_argument(
+        '-o',
+        action='store',
+        dest='outFile',
+        help='benchmark result file (default NA, not saved)',
+        default='NA')
+
+    parser.add_argument(
+        '-b',
+        action='store',
+        dest='baseline',
+        help='baseline benchmark result file to compare against \
+              (default NA)',
+        default='NA')
+
+    parser.add_argument(
+        '-d',
+        action='append',
+        dest='domains',
+        help='only run these domains, eg: -d tile -d racetrack \
+              (default: all of the matrix)',
+        default=[])
+
+    parser.add_argument(
+        '-a',
+        action='append',
+        dest='algorithms',
+        help='only run these commit algorithms (default: all of the matrix)',
+        default=[])
+
+    parser.add_argument(
+        '-r',
+        action='store',
+        type=int,
+        dest='repeats',
+        help='repeats of every run (default: from the matrix)',
+        default=None)
+
+    parser.add_argument(
+        '-p',
+        action='store',
+        type=float,
+        dest='alpha',
+        help='significance level of the comparison (default 0.05)',
+        default=0.05)
+
+    parser.add_argument(
+        '-e',
+        action='store',
+        type=float,
+        dest='minEffect',
+        help='smallest relative change, the median over instances, \
+              reported as a regression or improvement (default 0.05)',
+        default=0.05)
+
+    return parser
+
+
+def loadMatrix(matrixFile):
+    with open(matrixFile) as f:
+        return json.load(f)
+
+
+def minimumPValue(pairs):
+    # the smallest p-value the exact two sided signed-rank test on n
+    # pairs can reach, all of them changed in the same direction
+    return 2 / 2 ** pairs
+
+
+def checkMatrixPower(matrix, alpha):
+    # a case with too few instances can never be flagged, only its lost
+    # solves would be
+    for case in matrix["cases"]:
+        if minimumPValue(len(case["instances"])) >= alpha:
+            sys.exit("error: %d instances of %s %s can never reach p < %g" %
+                     (len(case["instances"]), case["domain"],
+                      case["subdomain"], alpha))
+
+
+def matrixRuns(matrix, args):
+    repeats = args.repeats or matrix["repeats"]
+
+    for case in matrix["cases"]:
+        if args.domains and case["domain"] not in args.domains:
+            continue
+
+        for algorithm in matrix["algorithms"]:
+            if args.algorithms and algorithm not in args.algorithms:
+                continue
+
+            for lookahead in matrix["lookaheads"]:
+                for instance in case["instances"]:
+                    for repeat in range(repeats):
+                        yield case, algorithm, lookahead, instance, repeat
+
+
+def gitRevision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "NA"
+
+
+def runSolver(command, inFile, timeLimit):
+    # no shell in between, so wait4 reports the peak rss of the solver;
+    # stderr goes to a file, a full pipe would block the solver
+    with open(inFile) as stdin, tempfile.TemporaryFile() as stderr:
+        start = time.perf_counter()
+        process = Popen(command, stdin=stdin, stdout=DEVNULL, stderr=stderr)
+
+        timer = Timer(timeLimit, process.kill)
+        timer.start()
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        finally:
+            timer.cancel()
+
+        wallTime = time.perf_counter() - start
+
+        stderr.seek(0)
+        error = stderr.read().decode("utf-8", errors="replace")
+
+    # wait4 reaped it already
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    # ru_maxrss is in kilobytes on linux
+    return process.returncode, wallTime, usage.ru_maxrss * 1024, error
+
+
+def readSolverRecord(outFile):
+    try:
+        with open(outFile) as f:
+            return json.load(f)
+    except (OSError, JSONDecodeError):
+        return None
+
+
+def benchmarkRun(args, matrix, case, algorithm, lookahead, instance):
+    inFile = os.path.join(args.worlds,
+                          case["input"].format(instance=instance))
+
+    fd, outFile = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+
+    command = [args.solver, "-d", case["domain"], "-s", case["subdomain"],
+               "-a", algorithm, "-l", str(lookahead), "-i", str(instance),
+               "-f", case["heuristicType"], "-o", outFile]
+
+    try:
+        returncode, wallTime, peakRss, error = runSolver(
+            command, inFile, matrix["timeLimit"])
+        record = readSolverRecord(outFile)
+    finally:
+        os.remove(outFile)
+
+    run = {"domain": case["domain"], "subdomain": case["subdomain"],
+           "algorithm": algorithm, "lookahead": lookahead,
+           "instance": instance, "wallTime": wallTime, "peakRss": peakRss}
+
+    if returncode != 0 or record is None:
+        run["status"] = "timeout" if wallTime >= matrix["timeLimit"] \
+            else "failed"
+        run["error"] = error[-2000:]
+        return run
+
+    run["status"] = "solved" if record.get("solution found") else "unsolved"
+    run["nodeExpanded"] = record.get("node expanded")
+    run["nodeGenerated"] = record.get("node generated")
+
+    # per lookahead iteration in newer solvers, total in older ones
+    lookaheadCpuTime = record.get("lookahead cpu time")
+    if isinstance(lookaheadCpuTime, list):
+        run["lookaheadCpuTime"] = sum(lookaheadCpuTime)
+        run["maxLookaheadCpuTime"] = max(lookaheadCpuTime, default=0.0)
+    elif lookaheadCpuTime is not None:
+        run["lookaheadCpuTime"] = lookaheadCpuTime
+
+    return run
+
+
+def cellKey(run):
+    return (run["domain"], run["subdomain"], run["algorithm"],
+            run["lookahead"])
+
+
+def numberedRuns(runs):
+    # (cell, instance, repeat) -> run; the k-th run of an instance in a
+    # cell is its k-th repeat, so it lines up with the k-th repeat of the
+    # same instance in another result
+    numbered = {}
+    repeats = {}
+    for run in runs:
+        instanceKey = cellKey(run) + (run["instance"],)
+        repeat = repeats.get(instanceKey, 0)
+        repeats[instanceKey] = repeat + 1
+        numbered[instanceKey + (repeat,)] = run
+    return numbered
+
+
+def instanceSamples(runs, metric):
+    # cell -> instance -> median of the metric over its solved repeats;
+    # repeats of one instance are not independent, node counts are even
+    # identical, so an instance is one sample
+    values = {}
+    for run in runs:
+        if run["status"] != "solved" or run.get(metric) is None:
+            continue
+        values.setdefault(cellKey(run), {}).setdefault(
+            run["instance"], []).append(run[metric])
+
+    return {key: {instance: median(samples)
+                  for instance, samples in instances.items()}
+            for key, instances in values.items()}
+
+
+def statusRegressions(current, baseline):
+    # a run the baseline solved and the current solver no longer does is
+    # a regression on its own, it has no metric left to compare
+    currentRuns = numberedRuns(current["runs"])
+    baselineRuns = numberedRuns(baseline["runs"])
+
+    regressions = 0
+    for key in sorted(set(currentRuns) & set(baselineRuns)):
+        status = currentRuns[key]["status"]
+        if baselineRuns[key]["status"] == "solved" and status != "solved":
+            print("%-45s %-18s %12s %12s %s" % (
+                "|".join(str(k) for k in key[:-2]),
+                "instance " + str(key[-2]) + " #" + str(key[-1]),
+                "solved", status, "REGRESSION"))
+            regressions += 1
+
+    return regressions
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2
+
+
+def wilcoxonSignedRank(x, y, exactPairs=50):
+    # two sided p-value of the signed-rank test on the log ratios of the
+    # matched pairs x[i], y[i], so an instance's difficulty cancels out and
+    # every instance weighs the same; equal pairs carry no sign and are
+    # dropped, as are pairs with a zero value. exact up to exactPairs
+    # pairs, normal approximation with tie correction above
+    d = [math.log(a) - math.log(b) for a, b in zip(x, y)
+         if a > 0 and b > 0 and a != b]
+    n = len(d)
+    if n == 0:
+        return 0.0, 1.0
+
+    order = sorted(range(n), key=lambda k: abs(d[k]))
+    ranks = [0.0] * n
+    tieSum = 0.0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and abs(d[order[j + 1]]) == abs(d[order[i]]):
+            j += 1
+
+        # tied differences share the average of their ranks
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        ties = j - i + 1
+        tieSum += ties ** 3 - ties
+        i = j + 1
+
+    wPlus = sum(rank for rank, diff in zip(ranks, d) if diff > 0)
+
+    if n <= exactPairs:
+        # under the null every rank is positive or negative with equal
+        # chance; count the sign assignments per rank sum, in half ranks
+        # so tied ranks stay integers
+        halfRanks = [int(round(2 * rank)) for rank in ranks]
+        total = sum(halfRanks)
+        counts = [1] + [0] * total
+        for rank in halfRanks:
+            for s in range(total, rank - 1, -1):
+                counts[s] += counts[s - rank]
+
+        w = int(round(2 * wPlus))
+        tail = min(sum(counts[:w + 1]), sum(counts[w:]))
+        return wPlus, min(1.0, 2 * tail / 2 ** n)
+
+    mean = n * (n + 1) / 4
+    variance = n * (n + 1) * (2 * n + 1) / 24 - tieSum / 48
+
+    if variance <= 0:
+        return wPlus, 1.0
+
+    z = (abs(wPlus - mean) - 0.5) / math.sqrt(variance)
+    return wPlus, min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+
+def compare(current, baseline, alpha, minEffect):
+    if current["matrixVersion"] != baseline["matrixVersion"]:
+        print("warning: matrix version", current["matrixVersion"],
+              "vs baseline", baseline["matrixVersion"])
+
+    regressions = statusRegressions(current, baseline)
+    untestable = 0
+
+    print("%-45s %-18s %12s %12s %8s %8s" % (
+        "cell", "metric", "baseline", "current", "ratio", "p"))
+
+    for metric in comparedMetrics:
+        currentCells = instanceSamples(current["runs"], metric)
+        baselineCells = instanceSamples(baseline["runs"], metric)
+
+        for key in sorted(set(currentCells) & set(baselineCells)):
+            instances = sorted(set(currentCells[key]) &
+                               set(baselineCells[key]))
+            if len(instances) < 2:
+                continue
+
+            x = [currentCells[key][instance] for instance in instances]
+            y = [baselineCells[key][instance] for instance in instances]
+
+            # the change of a cell is the median change of its instances
+            ratios = [a / b for a, b in zip(x, y) if b > 0]
+            ratio = median(ratios) if ratios else 1.0
+            _, p = wilcoxonSignedRank(x, y)
+
+            verdict = ""
+            if minimumPValue(len(instances)) >= alpha:
+                # too few instances solved in both to tell anything
+                verdict = "UNTESTABLE"
+                untestable += 1
+            elif p < alpha and ratio > 1 + minEffect:
+                verdict = "REGRESSION"
+                regressions += 1
+            elif p < alpha and ratio < 1 - minEffect:
+                verdict = "improvement"
+
+            print("%-45s %-18s %12.4g %12.4g %8.3f %8.4f %s" % (
+                "|".join(str(k) for k in key), metric, median(y),
+                median(x), ratio, p, verdict))
+
+    return regressions, untestable
+
+
+def writeResult(outFile, result):
+    outDir = os.path.dirname(os.path.abspath(outFile))
+    os.makedirs(outDir, exist_ok=True)
+
+    fd, tmpFile = tempfile.mkstemp(dir=outDir)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(result, f, indent=1)
+    os.replace(tmpFile, outFile)
+
+
+def main():
+    parser = parseArugments()
+    args = parser.parse_args()
+    print(args)
+
+    matrix = loadMatrix(args.matrix)
+    if args.baseline != 'NA':
+        checkMatrixPower(matrix, args.alpha)
+
+    result = {
+        "matrixVersion": matrix["version"],
+        "revision": gitRevision(),
+        "solver": args.solver,
+        "host": os.uname().nodename,
+        "date": datetime.now().isoformat(),
+        "runs": [],
+    }
+
+    runs = list(matrixRuns(matrix, args))
+    for counter, (case, algorithm, lookahead, instance, _) in \
+            enumerate(runs, 1):
+        run = benchmarkRun(args, matrix, case, algorithm, lookahead,
+                           instance)
+        result["runs"].append(run)
+
+        print(counter, "/", len(runs), case["domain"], case["subdomain"],
+              algorithm, lookahead, instance, run["status"],
+              "%.3fs" % run["wallTime"], run["peakRss"] // 1024, "KB")
+
+    if args.outFile != 'NA':
+        writeResult(args.outFile, result)
+
+    if args.baseline != 'NA':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        regressions, untestable = compare(result, baseline, args.alpha,
+                                          args.minEffect)
+        print(regressions, "significant regressions")
+
+        if untestable:
+            print(untestable, "comparisons have too few instances solved in "
+                  "both runs to ever reach p <", args.alpha)
+
+        if regressions or untestable:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
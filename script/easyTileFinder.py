@@ -3,7 +3,7 @@
 python3 script
 python script code for
 1. solve problems give problem folder and solver command, with time bound
-2. sort solved problems by number of node generated
+2. keep the k solved problems with the fewest nodes generated while results come in
 3. copy selected problems to target folder
 4. rename problem from instance id 1, and record the mapping, dump out the recording JSON
 5. dump out the solution
@@ -15,12 +15,15 @@ Date: 12/10/2020
 __author__ = 'TianyiGu'
 
 import argparse
+import heapq
 import os
 import json
-from subprocess import Popen, PIPE, TimeoutExpired
+import tempfile
 # import re
 from shutil import copy2
-from operator import getitem
+from threading import Lock
+
+from parallelSolver import solveProblems, outputLines
 
 researchHome = "/home/aifs1/gu/phd/research/workingPaper"
 
@@ -52,9 +55,130 @@ def parseArugments():
                         help='domain size (default: 4)',
                         default='4')
 
+    parser.add_argument(
+        '-j',
+        action='store',
+        type=int,
+        dest='workers',
+        help='number of solver runs at the same time (default 1)',
+        default=1)
+
+    parser.add_argument(
+        '-t',
+        action='store',
+        type=int,
+        dest='timeout',
+        help='time limit per run in seconds (default 300)',
+        default=300)
+
+    parser.add_argument(
+        '-n',
+        action='store',
+        type=int,
+        dest='easyCount',
+        help='number of easy problems to select (default 100)',
+        default=100)
+
+    parser.add_argument(
+        '-e',
+        action='store',
+        type=int,
+        dest='easyNodeGen',
+        help='stop solving once -n problems are solved with at most this \
+              many nodes generated (default 0, solve all problems)',
+        default=0)
+
+    parser.add_argument(
+        '-ts',
+        action='store',
+        type=float,
+        dest='timeSlack',
+        help='once -n problems are selected, cut runs off after this many \
+              times the slowest selected run, they will hardly be easier; \
+              runs cut off this way are retried when resumed \
+              (default 2, 0: always -t)',
+        default=2)
+
     return parser
 
 
+def dumpJson(fileName, data):
+    fd, tmpFile = tempfile.mkstemp(dir=os.path.dirname(fileName))
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmpFile, fileName)
+
+
+class EasySelector:
+    # the k easiest solved problems so far, a max heap on nodes generated;
+    # a selected problem is staged right away, an evicted one removed, and
+    # the name map and solution file always describe the current selection
+    def __init__(self, k, problemDir, outDir, nameMapFile, solutionFile):
+        self.k = k
+        self.heap = []
+        self.lock = Lock()
+        self.problemDir = problemDir
+        self.outDir = outDir
+        self.stageDir = outDir + ".staging/"
+        self.nameMapFile = nameMapFile
+        self.solutionFile = solutionFile
+
+        os.makedirs(self.stageDir, exist_ok=True)
+
+    def add(self, problemFile, nodeGen, solution, runtime):
+        entry = (-nodeGen, problemFile, solution, runtime)
+        evicted = None
+
+        with self.lock:
+            if len(self.heap) < self.k:
+                heapq.heappush(self.heap, entry)
+            elif nodeGen < -self.heap[0][0]:
+                evicted = heapq.heapreplace(self.heap, entry)
+            else:
+                return False
+
+        copy2(self.problemDir+problemFile, self.stageDir+problemFile)
+        if evicted is not None:
+            os.remove(self.stageDir+evicted[1])
+
+        self.dump()
+        return True
+
+    def ranked(self):
+        with self.lock:
+            return sorted(self.heap, key=lambda entry: (-entry[0], entry[1]))
+
+    def cutoffTime(self, timeout, slack):
+        # the solvers take no node generation limit and only report nodes
+        # generated when they finish, so the runtime of the selected runs
+        # stands in for the limit of the k-th best once the selection is full
+        with self.lock:
+            if slack <= 0 or len(self.heap) < self.k:
+                return timeout
+            slowest = max(entry[3] for entry in self.heap)
+            # process start up noise is not worth cutting a run for
+            return min(timeout, max(1.0, slack * slowest))
+
+    def dump(self):
+        newName_oldName = {}
+        solutionJson = {}
+        for counter, entry in enumerate(self.ranked(), 1):
+            newName_oldName[str(counter)+'-4x4.st'] = entry[1]
+            solutionJson[str(counter)+"-4x4.st"] = entry[2]
+
+        dumpJson(self.nameMapFile, newName_oldName)
+        dumpJson(self.solutionFile, solutionJson)
+
+    def finish(self):
+        # staged copies take their final names, nothing is copied twice
+        for counter, entry in enumerate(self.ranked(), 1):
+            os.replace(self.stageDir+entry[1],
+                       self.outDir+str(counter)+"-4x4.st")
+
+        os.rmdir(self.stageDir)
+        self.dump()
+
+
 def solverConfig():
 
     solver = {"tile": {"uniform": researchHome +
@@ -141,69 +265,60 @@ def main():
         # problemDir = researchHome+"/realtime-nancy/worlds/" + \
             # problemFolder[args.domain]+"/"+args.size+"/"
 
-    nodeGenJson = {}
+    outDir = researchHome+"/realtime-nancy/worlds/" +\
+        problemFolder[args.domain] + "-easy-for-"+args.subdomain+"/"
+
+    # partial results live next to the problem folders, a rerun resumes
+    resultFile = researchHome+"/realtime-nancy/worlds/" +\
+        problemFolder[args.domain] + "-easy-for-"+args.subdomain+"-runs.ndjson"
+
+    nameMapFile = researchHome+"/boundedCostSearch/optimalSolution/tile." +\
+        args.subdomain+"-easy-new-old-namemap.json"
 
-    counter = 0
-    solvedCounter=0
-    total = len(os.listdir(problemDir))
-    print("solving problems, total", total)
-    for problemFile in os.listdir(problemDir):
-    #     if(len(nodeGenJson) == 100):
-            # break
+    solutionOutFile = researchHome+"/boundedCostSearch/optimalSolution/" +\
+        args.domain+"."+args.subdomain+"-easy.json"
 
-        counter += 1
-        command = solver + " < " + problemDir+problemFile
+    if not os.path.exists(outDir):
+        os.makedirs(outDir)
 
-        # print("command ",command)
+    selector = EasySelector(args.easyCount, problemDir, outDir, nameMapFile,
+                            solutionOutFile)
 
-        process = Popen("exec " + command, stdin=PIPE,
-                        stdout=PIPE, stderr=PIPE, shell=True)
+    commands = {problemFile: solver + " < " + problemDir+problemFile
+                for problemFile in sorted(os.listdir(problemDir))}
 
-        try:
-            outlines = process.communicate(timeout=300)[0].splitlines()
-            nodeGen, sol = solverOutPutParser(args, outlines)
-            nodeGenJson[problemFile] = {"nodeGen":int(nodeGen), "solution": sol }
-            solvedCounter += 1
-            print(problemFile, nodeGen, str(counter/total*100)+"%", "solved: ", solvedCounter)
-        except TimeoutExpired:
-            process.kill()
-            print(problemFile, "cutoff", str(counter/total*100)+"%", "solved: ", solvedCounter)
+    solved = {"all": 0, "easy": 0}
 
-    outDir = researchHome+"/realtime-nancy/worlds/" +\
-        problemFolder[args.domain] + "-easy-for-"+args.subdomain+"/"
+    def selectProblem(problemFile, record):
+        if record["status"] != "solved":
+            return
 
-    if not os.path.exists(outDir):
-        os.makedirs(outDir)
+        nodeGen, sol = solverOutPutParser(args, outputLines(record))
+        solved["all"] += 1
+        if int(nodeGen) <= args.easyNodeGen:
+            solved["easy"] += 1
 
-    sortedByNodeGen = dict(sorted(nodeGenJson.items(), key=lambda x: getitem(x[1], 'nodeGen')))
+        selector.add(problemFile, int(nodeGen), sol, record["runtime"])
 
-    print(sortedByNodeGen)
+    def enoughEasy(_results):
+        return args.easyNodeGen > 0 and solved["easy"] >= args.easyCount
 
-    print("copying files...")
-    counter=0
-    newName_oldName = {}
-    solutionJson={}
-    for fileName in sortedByNodeGen:
-        counter += 1
-        if counter > 100:
-            break
+    def runTimeout():
+        return selector.cutoffTime(args.timeout, args.timeSlack)
 
-        copy2(problemDir+fileName, outDir+str(counter)+"-4x4.st")
-        newName_oldName[str(counter)+'-4x4.st'] = fileName
-        solutionJson[str(counter)+"-4x4.st"] = sortedByNodeGen[fileName]["solution"]
+    results = solveProblems(commands, args.workers, args.timeout, resultFile,
+                            enoughEasy, selectProblem, runTimeout)
 
-    print("dump rename mapping")
-    with open("/home/aifs1/gu/phd/research/workingPaper/boundedCostSearch/optimalSolution/tile."+\
-              args.subdomain+"-easy-new-old-namemap.json", 'w') as f:
-        json.dump(newName_oldName, f)
+    print("solved: ", solved["all"], "of", len(results), "run")
 
+    print("moving selected files...")
+    selector.finish()
 
-    print("dump solution file")
-    solutionOutFile = researchHome+"/boundedCostSearch/optimalSolution/" +\
-        args.domain+"."+args.subdomain+"-easy.json"
+    for counter, entry in enumerate(selector.ranked(), 1):
+        print(str(counter)+"-4x4.st", entry[1], -entry[0])
 
-    with open(solutionOutFile, 'w') as json_file:
-        json.dump(solutionJson, json_file)
+    print("rename mapping", nameMapFile)
+    print("solution file", solutionOutFile)
 
 
 if __name__ == '__main__':
@@ -3,6 +3,13 @@
 python3 script
 python script code for fixing json result format.
 
+a file is read once and checked for a single closing brace at its end;
+only files that fail the check are repaired, cut after the last closing
+brace that leaves valid json, to a temp file that then replaces the
+original. files that no cut repairs, or that cannot be read or written,
+are reported and left untouched. directories and files are processed
+concurrently.
+
 Author: Tianyi Gu
 Date: 09/29/2020
 '''
@@ -10,9 +17,15 @@ Date: 09/29/2020
 __author__ = 'TianyiGu'
 
 import argparse
+import json
 import os
-import re
-import in_place
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from json.decoder import JSONDecodeError
+
+from plot import resultStore
+from plot.resultStore import ingest, storeDirectory
 
 researchHome = "/home/aifs1/gu/phd/research/workingPaper"
 # researchHome = "/home/aifs1/gu/Downloads"
@@ -52,6 +65,43 @@ def parseArugments():
         help='heuristicType: racetrack: euclidean(default), dijkstra;',
         default='euclidean')
 
+    parser.add_argument(
+        '-j',
+        action='store',
+        type=int,
+        dest='workers',
+        help='number of files checked at the same time (default 16)',
+        default=16)
+
+    parser.add_argument(
+        '-c',
+        action='store_true',
+        dest='checkOnly',
+        help='only report broken files, do not rewrite them')
+
+    parser.add_argument(
+        '-rt',
+        action='store_true',
+        dest='realtime',
+        help='repair the realtime solver results under -r instead of the \
+              boundedSuboptimalSearch ones; default algorithms: all')
+
+    parser.add_argument(
+        '-r',
+        action='store',
+        dest='realtimeResultDir',
+        help='realtime result root directory (default: ../../../results, \
+              as in plot/resultStore.py)',
+        default='../../../results')
+
+    parser.add_argument(
+        '-m',
+        action='store_true',
+        dest='migrate',
+        help='after repairing, ingest the records into the result store \
+              of the subdomain; realtime results (-rt) only, the store has \
+              no columns for boundedSuboptimalSearch records')
+
 #     parser.add_argument('-z',
     # action='store',
     # dest='size',
@@ -61,47 +111,142 @@ def parseArugments():
     return parser
 
 
+def isValid(text):
+    # the solver writes one flat record, a single brace closing the file
+    stripped = text.rstrip()
+    if stripped.count('}') == 1 and stripped.endswith('}'):
+        return True
+
+    # nested records have more braces, only they pay for a full parse
+    try:
+        json.loads(text)
+        return True
+    except JSONDecodeError:
+        return False
+
+
+def repair(text):
+    # cut after the last closing brace that leaves valid json, dropping
+    # whatever the solver wrote past the end of the record; None if no
+    # cut does
+    end = text.rfind('}')
+    while end >= 0:
+        repaired = text[:end + 1]
+        try:
+            json.loads(repaired)
+            return repaired
+        except JSONDecodeError:
+            end = text.rfind('}', 0, end)
+    return None
+
+
+def writeAtomic(fileName, text):
+    fd, tmpFile = tempfile.mkstemp(dir=os.path.dirname(fileName),
+                                   suffix=".json.tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        shutil.copymode(fileName, tmpFile)
+        os.replace(tmpFile, fileName)
+    except BaseException:
+        os.remove(tmpFile)
+        raise
+
+
+def fixFile(fileName, checkOnly=False):
+    # None for a valid file, otherwise what happened to it: broken (only
+    # checked), repaired, or unrepairable, unreadable or unwritable (left
+    # as it is); one bad file must not stop the others
+    try:
+        with open(fileName) as f:
+            text = f.read()
+    except (UnicodeDecodeError, OSError):
+        return "unreadable"
+
+    if isValid(text):
+        return None
+
+    if checkOnly:
+        return "broken"
+
+    repaired = repair(text)
+    if repaired is None:
+        return "unrepairable"
+
+    try:
+        writeAtomic(fileName, repaired)
+    except OSError:
+        return "unwritable"
+    return "repaired"
+
+
+def listJsonFiles(fileDir):
+    with os.scandir(fileDir) as entries:
+        return [entry.path for entry in entries if entry.name[-5:] == ".json"]
+
+
 def main():
 
     parser = parseArugments()
     args = parser.parse_args()
     print(args)
 
+    if args.migrate and not args.realtime:
+        parser.error("-m ingests realtime solver records only, use -rt")
+
+    if args.realtime:
+        resultDir = args.realtimeResultDir
+    else:
+        resultDir = researchHome + "/boundedSuboptimalSearch/results"
+
+    storeDir = storeDirectory(resultDir, args.domain, args.subdomain,
+                              args.heuristicType)
+
     algorithms = ['ees', 'wastar']
 
     if len(args.algorithms) != 0:
         algorithms = args.algorithms
+    elif args.realtime:
+        algorithms = resultStore.algorithmDirectories(storeDir)
 
-    resultDir = "results"
-
+    fileDirs = []
     for algorithm in algorithms:
 
-        fileDir = researchHome + "/boundedSuboptimalSearch/" + resultDir + "/" + \
-            args.domain+"/"+args.subdomain+"/"
-
-        if args.domain in ["racetrack", "pancake"]:
-            fileDir += args.heuristicType+"/"
-
-        fileDir += algorithm+"/"
+        fileDir = storeDir + "/" + algorithm + "/"
 
         if not os.path.exists(fileDir):
             print("not found, skip ", algorithm)
             continue
 
-        print("processing ", algorithm)
-        for fileName in os.listdir(fileDir):
+        fileDirs.append(fileDir)
+
+    with ThreadPoolExecutor(args.workers) as pool:
+        # directory listings and file reads are io bound, on nfs mostly
+        # waiting, so they overlap well in threads
+        fileNames = [fileName
+                     for files in pool.map(listJsonFiles, fileDirs)
+                     for fileName in files]
+
+        print("checking ", len(fileNames), "files")
+
+        broken = [(fileName, status) for fileName, status in zip(
+            fileNames, pool.map(fixFile, fileNames,
+                                [args.checkOnly] * len(fileNames)))
+                  if status is not None]
+
+    for fileName, status in broken:
+        print(status, fileName)
 
-            # print("processing ", fileName)
-            if fileName[-5:] != ".json":
-                continue
+    for status in ["broken", "repaired", "unrepairable", "unreadable",
+                   "unwritable"]:
+        count = sum(1 for _, fileStatus in broken if fileStatus == status)
+        if count:
+            print(count, "of", len(fileNames), "files", status)
 
-            with in_place.InPlace(fileDir+fileName) as file:
-                for line in file:
-                    match = [m.start() for m in re.finditer(r'}', line)]
-                    if len(match) > 1 or line[-1] != '}':
-                        file.write(line[:(match[0]+1)])
-                    else:
-                        file.write(line)
+    if args.migrate:
+        store = ingest(storeDir, algorithms)
+        print("result store of", storeDir, "has", len(store["resultFile"]),
+              "records")
 
 
 if __name__ == '__main__':
@@ -9,11 +9,44 @@ Date: 01/18/2021
 
 __author__ = 'TianyiGu'
 
-from subprocess import Popen, PIPE
+import argparse
+
+from parallelSolver import solveProblems, outputLines
 
 researchHome = "/home/aifs1/gu/phd/research/workingPaper"
 
 
+def parseArugments():
+
+    parser = argparse.ArgumentParser(description='hardnessSorter')
+
+    parser.add_argument(
+        '-j',
+        action='store',
+        type=int,
+        dest='workers',
+        help='number of solver runs at the same time (default 1)',
+        default=1)
+
+    parser.add_argument(
+        '-t',
+        action='store',
+        type=int,
+        dest='timeout',
+        help='time limit per run in seconds (default 0, no limit)',
+        default=0)
+
+    parser.add_argument(
+        '-rf',
+        action='store',
+        dest='resultFile',
+        help='ndjson file of finished runs, resumed if it exists \
+              (default NA, not saved)',
+        default='NA')
+
+    return parser
+
+
 def solverConfig():
 
     optimalSolver = {"uniform": researchHome +
@@ -43,31 +76,38 @@ def solverOutPutParser(outStr):
     return -1
 
 def main():
+    parser = parseArugments()
+    args = parser.parse_args()
+    print(args)
+
     solvers = solverConfig()
 
     subdomains=["heavy","inverse","sqrt"]
 
     problemDir = researchHome+"/realtime-nancy/worlds/slidingTile/"
 
-    nodeGenSum = {}
+    commands = {}
     for subdomain in subdomains:
-        solver = solvers[subdomain]
-        nodeGenSum[subdomain] = 0
-
         for sid in range(1,11):
-            command = solver + " < " + problemDir+str(sid)+"-4x4.st"
+            commands[subdomain + "/" + str(sid)] = solvers[subdomain] + \
+                " < " + problemDir+str(sid)+"-4x4.st"
 
-            print("command ",command)
+    results = solveProblems(
+        commands, args.workers, args.timeout or None,
+        None if args.resultFile == 'NA' else args.resultFile)
 
-            process = Popen("exec " + command, stdin=PIPE,
-                            stdout=PIPE, stderr=PIPE, shell=True)
+    nodeGenSum = {subdomain: 0 for subdomain in subdomains}
+    for problem, record in sorted(results.items()):
+        subdomain, sid = problem.split("/")
 
-            outlines = process.communicate()[0].splitlines()
+        if record["status"] != "solved":
+            print(subdomain, sid, record["status"])
+            continue
 
-            nodeGen = solverOutPutParser(outlines)
-            print(subdomain, sid, nodeGen)
+        nodeGen = solverOutPutParser(outputLines(record))
+        print(subdomain, sid, nodeGen)
 
-            nodeGenSum[subdomain] += int(nodeGen)
+        nodeGenSum[subdomain] += int(nodeGen)
 
     sortedByNodeGen = dict(sorted(nodeGenSum.items(),key=lambda x:x[1]))
 
@@ -0,0 +1,179 @@
+#!/usr/bin/ python
+'''
+python3 script
+shared parallel runner for the solver driving scripts
+
+run one solver command per problem on a pool of worker threads, each
+driving its own solver process, with a per run timeout. finished runs are
+appended to an ndjson result file as they come in, so an interrupted sweep
+resumes where it stopped, and the sweep can be cut off early once the
+caller has enough results.
+'''
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from json.decoder import JSONDecodeError
+from subprocess import Popen, PIPE, TimeoutExpired
+from threading import Event, Lock
+
+
+def loadResults(resultFile):
+    results = {}
+
+    if resultFile is None or not os.path.exists(resultFile):
+        return results
+
+    with open(resultFile) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except JSONDecodeError:
+                # the last line of an interrupted sweep may be cut short
+                continue
+            results[record["problem"]] = record
+
+    return results
+
+
+def isFinal(record, timeout):
+    # a run cut off before the full time limit, by a limit tightened while
+    # the sweep went on or a smaller -t, may still be solved with more time;
+    # records written without a time limit have their runtime stand in
+    if record["status"] != "cutoff":
+        return True
+    if timeout is None:
+        return False
+    return record.get("timeLimit", record["runtime"]) >= timeout
+
+
+def outputLines(record):
+    # the solver output as the byte lines the output parsers expect
+    return record["output"].encode("utf-8").splitlines()
+
+
+class RunningProcesses:
+    def __init__(self):
+        self.processes = set()
+        self.lock = Lock()
+        self.stopped = Event()
+
+    def add(self, process):
+        with self.lock:
+            if self.stopped.is_set():
+                process.kill()
+            self.processes.add(process)
+
+    def remove(self, process):
+        with self.lock:
+            self.processes.discard(process)
+
+    def stop(self):
+        with self.lock:
+            self.stopped.set()
+            for process in self.processes:
+                process.kill()
+
+
+def runCommand(command, timeout, running):
+    # a callable timeout is asked when the run starts, so the limit can
+    # tighten while the sweep goes on
+    if callable(timeout):
+        timeout = timeout()
+
+    start = time.time()
+
+    process = Popen("exec " + command, stdin=PIPE,
+                    stdout=PIPE, stderr=PIPE, shell=True)
+    running.add(process)
+
+    try:
+        output = process.communicate(timeout=timeout)[0]
+        status = "solved" if process.returncode == 0 else "error"
+    except TimeoutExpired:
+        process.kill()
+        output = process.communicate()[0]
+        status = "cutoff"
+    finally:
+        running.remove(process)
+
+    # killed by an early cut off, not a result of the problem
+    if running.stopped.is_set() and status != "solved":
+        status = "stopped"
+
+    return {"status": status,
+            "runtime": time.time() - start,
+            "timeLimit": timeout,
+            "output": output.decode("utf-8", errors="replace")}
+
+
+def solveProblems(commands, workers=1, timeout=None, resultFile=None,
+                  stopWhen=None, onResult=None, tightenTimeout=None):
+    # commands: problem name -> solver command
+    # timeout: seconds per run, None for no limit
+    # tightenTimeout: function returning the limit for a run about to start,
+    #                 at most timeout; runs it cuts off short are retried
+    #                 when the sweep is resumed
+    # onResult: called with every result as it comes in, resumed ones first
+    # stopWhen: called with the results after every finished run, the
+    #           remaining runs are dropped once it returns True
+    # returns problem name -> {"status", "runtime", "timeLimit", "output"}
+    results = {problem: record
+               for problem, record in loadResults(resultFile).items()
+               if isFinal(record, timeout)}
+
+    if onResult is not None:
+        for problem, record in results.items():
+            onResult(problem, record)
+
+    if stopWhen is not None and stopWhen(results):
+        return results
+
+    pending = [problem for problem in commands if problem not in results]
+    print("solving problems, total", len(commands), "to run", len(pending))
+
+    running = RunningProcesses()
+    out = open(resultFile, 'a') if resultFile is not None else None
+
+    try:
+        with ThreadPoolExecutor(workers) as pool:
+            futures = {pool.submit(runCommand, commands[problem],
+                                   tightenTimeout or timeout,
+                                   running): problem
+                       for problem in pending}
+
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+
+                problem = futures[future]
+                record = future.result()
+                if record["status"] == "stopped":
+                    continue
+
+                record["problem"] = problem
+                results[problem] = record
+
+                if out is not None:
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+
+                print(problem, record["status"],
+                      "%.1fs" % record["runtime"],
+                      str(len(results)) + "/" + str(len(commands)))
+
+                if onResult is not None:
+                    onResult(problem, record)
+
+                if stopWhen is not None and not running.stopped.is_set() \
+                        and stopWhen(results):
+                    print("enough results, stop the remaining runs")
+                    for other in futures:
+                        other.cancel()
+                    running.stop()
+    finally:
+        if out is not None:
+            out.close()
+
+    return results
@@ -10,19 +10,41 @@ Date: 02/14/2021
 __author__ = 'TianyiGu'
 
 import argparse
-import json
+import importlib
+import itertools
 import os
+import time
 # import sys
 from datetime import datetime
 # import re
 # import math
 # from scipy.stats import gmean
 
-import matplotlib.pyplot as plt
-import pandas as pd
-import seaborn as sns
 # from pandas.plotting import table
-# import numpy as np
+import numpy as np
+
+try:
+    from orjson import loads as parseJson
+except ImportError:
+    from json import loads as parseJson
+
+# column name -> (trace key, dtype)
+traceColumns = {
+    "fhatmin": ("fhatmin", np.float64),
+    "fmin": ("fmin", np.float64),
+    "expansion": ("expansion", np.int64),
+    "fhatminVar": ("fhatmin var", np.float64),
+    "pvalue": ("dxesProbValue", np.float64),
+    "fhat": ("fhat", np.float64),
+    "fhatvar": ("fhat var", np.float64),
+    "focalsize": ("focal size", np.int64),
+}
+
+# heavy plotting modules, imported by importPlottingModules once a figure
+# is about to be built, so -h and bad arguments return right away
+plt = None
+pd = None
+sns = None
 
 
 def parseArugments():
@@ -36,10 +58,129 @@ def parseArugments():
         help='plot type: var',
         default='var')
 
+    parser.add_argument(
+        '-i',
+        action='store',
+        dest='inFile',
+        help='trace file, one json record per line \
+              (default ../../../../build_debug/tianyi.txt)',
+        default='../../../../build_debug/tianyi.txt')
+
+    parser.add_argument(
+        '-cs',
+        action='store',
+        type=int,
+        dest='chunkSize',
+        help='trace lines parsed per chunk (default 100000)',
+        default=100000)
+
+    parser.add_argument(
+        '-bw',
+        action='store',
+        type=int,
+        dest='binWidth',
+        help='average the trace over bins of this many expansions while \
+              reading, memory then grows with the trace length over the \
+              width; (default) 0: start at one expansion and double the \
+              width whenever there are more than 8 x -mp bins, so memory \
+              stays bounded for a trace of any length',
+        default=0)
+
+    parser.add_argument(
+        '-mp',
+        action='store',
+        type=int,
+        dest='maxPoints',
+        help='points drawn per panel, the trace is downsampled with \
+              largest triangle three buckets (default 2000, 0: all, \
+              and bins of -bw 0 are never widened)',
+        default=2000)
+
+    parser.add_argument(
+        '-bk',
+        action='store',
+        dest='backend',
+        help='matplotlib backend (default Agg, no display needed)',
+        default='Agg')
+
+    parser.add_argument(
+        '-pi',
+        action='store_true',
+        dest='profileImports',
+        help='print the time spent importing the plotting modules')
+
     return parser
 
 
-def makeTwoLinePlot(dataframe, outputName):
+def timedImport(moduleName, timings):
+    start = time.perf_counter()
+    module = importlib.import_module(moduleName)
+    timings.append((moduleName, time.perf_counter() - start))
+    return module
+
+
+def importPlottingModules(backend='Agg', profile=False):
+    global plt, pd, sns
+
+    if plt is not None:
+        return
+
+    timings = []
+
+    timedImport("matplotlib", timings).use(backend)
+    plt = timedImport("matplotlib.pyplot", timings)
+    pd = timedImport("pandas", timings)
+    sns = timedImport("seaborn", timings)
+
+    if profile:
+        for moduleName, seconds in timings:
+            print("import %-18s %.3fs" % (moduleName, seconds))
+        print("import %-18s %.3fs" % ("total", sum(t for _, t in timings)))
+
+
+def largestTriangleThreeBuckets(x, y, threshold):
+    # indices of the threshold points that keep the visual shape of the
+    # series: first and last point, and from each bucket the point forming
+    # the largest triangle with the previous pick and the next bucket mean
+    n = len(x)
+    if threshold < 3 or n <= threshold:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+
+        if i + 2 < len(edges):
+            nextX = x[end:edges[i + 2]].mean()
+            nextY = y[end:edges[i + 2]].mean()
+        else:
+            nextX, nextY = x[n - 1], y[n - 1]
+
+        area = np.abs((x[a] - nextX) * (y[start:end] - y[a]) -
+                      (x[a] - x[start:end]) * (nextY - y[a]))
+        a = start + np.argmax(np.nan_to_num(area, nan=-1.0))
+        selected[i + 1] = a
+
+    return selected
+
+
+def downsample(dataframe, yAxis, maxPoints):
+    # one point per expansion, then at most maxPoints of them
+    series = dataframe.groupby("expansion")[yAxis].mean()
+
+    x = series.index.to_numpy(dtype=np.float64)
+    y = series.to_numpy(dtype=np.float64)
+    selected = largestTriangleThreeBuckets(x, y, maxPoints)
+
+    return pd.DataFrame({"expansion": x[selected], yAxis: y[selected]})
+
+
+def makeTwoLinePlot(dataframe, outputName, maxPoints=2000):
     sns.set(rc={
         'figure.figsize': (13, 10),
         'font.size': 27,
@@ -52,49 +193,56 @@ def makeTwoLinePlot(dataframe, outputName):
 
     sns.lineplot(x="expansion",
                  y="fhatminVar",
-                 data=dataframe,
+                 data=downsample(dataframe, "fhatminVar", maxPoints),
+                 errorbar=None,
                  color="red",
                  ax=ax1
                  )
 
     sns.lineplot(x="expansion",
                  y="fhatmin",
-                 data=dataframe,
+                 data=downsample(dataframe, "fhatmin", maxPoints),
+                 errorbar=None,
                  color="blue",
                  ax=ax2
                  )
 
     sns.lineplot(x="expansion",
                  y="fhatvar",
-                 data=dataframe,
+                 data=downsample(dataframe, "fhatvar", maxPoints),
+                 errorbar=None,
                  color="red",
                  ax=ax3
                  )
 
     sns.lineplot(x="expansion",
                  y="fhat",
-                 data=dataframe,
+                 data=downsample(dataframe, "fhat", maxPoints),
+                 errorbar=None,
                  color="blue",
                  ax=ax4
                  )
 
     sns.lineplot(x="expansion",
                  y="fmin",
-                 data=dataframe,
+                 data=downsample(dataframe, "fmin", maxPoints),
+                 errorbar=None,
                  color="green",
                  ax=ax5
                  )
 
     sns.lineplot(x="expansion",
                  y="pvalue",
-                 data=dataframe,
+                 data=downsample(dataframe, "pvalue", maxPoints),
+                 errorbar=None,
                  color="green",
                  ax=ax6
                  )
 
     sns.lineplot(x="expansion",
                  y="focalsize",
-                 data=dataframe,
+                 data=downsample(dataframe, "focalsize", maxPoints),
+                 errorbar=None,
                  color="green",
                  ax=ax7
                  )
@@ -113,44 +261,84 @@ def makeTwoLinePlot(dataframe, outputName):
     plt.cla()
 
 
-def readData():
+def readTraceChunks(inFile, chunkSize):
+    # typed columns of chunkSize lines at a time, never the whole trace
+    with open(inFile, 'rb') as f:
+        while True:
+            lines = list(itertools.islice(f, chunkSize))
+            if not lines:
+                break
 
-    fhatmin = []
-    fmin = []
-    expansion = []
-    fhatminVar = []
-    pvalue = []
-    fhat = []
-    fhatvar = []
-    focalsize = []
+            records = [parseJson(line) for line in lines if line.strip()]
+
+            yield pd.DataFrame({
+                column: np.fromiter((record[key] for record in records),
+                                    dtype, len(records))
+                for column, (key, dtype) in traceColumns.items()
+            })
+
+
+def mergeBins(partials):
+    # per-bin sums and counts of several chunks as one frame
+    return pd.concat(partials).groupby(level=0).sum()
+
+
+def coarsenBins(bins, binWidth, maxBins):
+    # doubles the bin width until there are at most maxBins bins; the sums
+    # and counts of the narrower bins add up exactly, they nest in the wider
+    while len(bins) > maxBins:
+        binWidth *= 2
+        bins.index = bins.index // binWidth * binWidth
+        bins = bins.groupby(level=0).sum()
+
+    return bins, binWidth
+
+
+def readData(inFile, chunkSize=100000, binWidth=0, maxBins=16000,
+             mergeEvery=16):
 
     print("reading in data...")
 
-    inFile = "../../../../build_debug/tianyi.txt"
     print("reading ", inFile)
-    with open(inFile) as f:
-        for json_data in f:
-            # print(json_data)
-            resultData = json.loads(json_data)
-            fhatmin.append(resultData["fhatmin"])
-            fmin.append(resultData["fmin"])
-            expansion.append(resultData["expansion"])
-            fhatminVar.append(resultData["fhatmin var"])
-            pvalue.append(resultData["dxesProbValue"])
-            fhat.append(resultData["fhat"])
-            fhatvar.append(resultData["fhat var"])
-            focalsize.append(resultData["focal size"])
-
-    rawdf = pd.DataFrame({
-        "fhatmin": fhatmin,
-        "fmin": fmin,
-        "expansion": expansion,
-        "fhatminVar": fhatminVar,
-        "pvalue": pvalue,
-        "fhat": fhat,
-        "fhatvar": fhatvar,
-        "focalsize": focalsize,
-    })
+
+    # running per-bin sums and counts, a bin may span several chunks; the
+    # partial results are merged every few chunks. a fixed bin width keeps
+    # a row per bin, that is per expansion at width one, so memory grows
+    # with the trace length over the width; width 0 starts at one
+    # expansion and is doubled whenever there are more than maxBins bins,
+    # which bounds memory by maxBins plus a chunk for any trace length
+    autoWidth = binWidth <= 0 and maxBins > 0
+    binWidth = max(binWidth, 1)
+    partials = []
+    rows = 0
+
+    for chunk in readTraceChunks(inFile, chunkSize):
+        chunk["expansion"] = chunk["expansion"] // binWidth * binWidth
+        groups = chunk.groupby("expansion")
+
+        partial = groups.sum()
+        partial["count"] = groups.size()
+        partials.append(partial)
+        rows += len(partial)
+
+        if len(partials) >= mergeEvery or (autoWidth and rows > maxBins):
+            bins = mergeBins(partials)
+            if autoWidth:
+                bins, binWidth = coarsenBins(bins, binWidth, maxBins)
+            partials = [bins]
+            rows = len(bins)
+
+    if not partials:
+        return pd.DataFrame(columns=list(traceColumns))
+
+    bins = mergeBins(partials)
+    if autoWidth:
+        bins, binWidth = coarsenBins(bins, binWidth, maxBins)
+        print("bin width ", binWidth)
+
+    counts = bins.pop("count")
+
+    rawdf = bins.div(counts, axis=0).reset_index()
 
     # print rawdf
     return rawdf
@@ -175,9 +363,12 @@ def main():
     args = parser.parse_args()
     print(args)
 
-    df = readData()
+    importPlottingModules(args.backend, args.profileImports)
+
+    df = readData(args.inFile, args.chunkSize, args.binWidth,
+                  8 * args.maxPoints)
 
-    makeTwoLinePlot(df, createOutFilePrefix(args) + ".jpg")
+    makeTwoLinePlot(df, createOutFilePrefix(args) + ".jpg", args.maxPoints)
 
 
 if __name__ == '__main__':
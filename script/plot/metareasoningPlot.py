@@ -10,24 +10,27 @@ Date: 04/21/2021
 __author__ = 'TianyiGu'
 
 import argparse
-import json
+import importlib
+import multiprocessing
 import os
+import shlex
+import time
 # import sys
 from datetime import datetime
-import re
 # import math
-from json.decoder import JSONDecodeError
-import sys
 
-from scipy.stats import gmean
-
-import matplotlib.pyplot as plt
-import pandas as pd
-import seaborn as sns
-from pandas.plotting import table
 import numpy as np
 
 from plotConfig import Configure
+import resultStore
+
+# heavy plotting modules, imported by importPlottingModules once a figure
+# is about to be built, so -h and bad arguments return right away
+gmean = None
+plt = None
+pd = None
+sns = None
+table = None
 
 def parseArugments():
 
@@ -75,7 +78,33 @@ def parseArugments():
         action='store',
         dest='plotType',
         help='plot type, nodeGen(default), cpu, coveragetb, coverageplt, \
-                         nodeGenDiff, fixedbaseline, part10',
+                         nodeGenDiff, fixedbaseline, part10, latency; \
+                         <metric>Diff for any metric, eg: cpuDiff, \
+                         solutionCostDiff, GATnodeExpDiff',
+        default='nodeGen')
+
+    parser.add_argument(
+        '-dl',
+        action='store',
+        dest='deadline',
+        help='latency: per step cpu time deadline in seconds, steps above \
+              it count as violations (default NA, no deadline)',
+        default='NA')
+
+    parser.add_argument(
+        '-bl',
+        action='store',
+        dest='baseline',
+        help='baseline algorithm of nodeGenDiff, fixedbaseline \
+              (default NA, the first algorithm)',
+        default='NA')
+
+    parser.add_argument(
+        '-pm',
+        action='store',
+        dest='pairWiseMetric',
+        help='metric of fixedbaseline: nodeGen(default), nodeExp, cpu, \
+              solutionCost, solutionLength, GATnodeExp',
         default='nodeGen')
 
     parser.add_argument(
@@ -107,15 +136,123 @@ def parseArugments():
         help='remove (omit) algorithm (default NA)',
         default=[])
 
+    parser.add_argument(
+        '-u',
+        action='store_true',
+        dest='updateStore',
+        help='rebuild the result store from all result json files before \
+              plotting (default: only ingest new or changed files)')
+
+    parser.add_argument(
+        '-c',
+        action='store',
+        dest='compendium',
+        help='compendium spec file: one figure per line, given by the \
+              arguments of this script, eg: -d tile -s heavy -t cpu -os loose; \
+              every figure is rendered in this process (default NA)',
+        default='NA')
+
+    parser.add_argument(
+        '-j',
+        action='store',
+        type=int,
+        dest='processes',
+        help='compendium: number of rendering processes (default 1)',
+        default=1)
+
+    parser.add_argument(
+        '-bk',
+        action='store',
+        dest='backend',
+        help='matplotlib backend (default Agg, no display needed)',
+        default='Agg')
+
+    parser.add_argument(
+        '-em',
+        action='store',
+        dest='errorMode',
+        help='error bars of line plots: normal(default), mean and normal \
+              approximation CI computed before rendering; bootstrap, \
+              seaborn bootstraps over every result (slow)',
+        default='normal')
+
+    parser.add_argument(
+        '-pi',
+        action='store_true',
+        dest='profileImports',
+        help='print the time spent importing the plotting modules')
+
     return parser
 
+
+def timedImport(moduleName, timings):
+    start = time.perf_counter()
+    module = importlib.import_module(moduleName)
+    timings.append((moduleName, time.perf_counter() - start))
+    return module
+
+
+def printImportProfile(timings):
+    for moduleName, seconds in timings:
+        print("import %-18s %.3fs" % (moduleName, seconds))
+    print("import %-18s %.3fs" % ("total", sum(t for _, t in timings)))
+
+
+importProfile = False
+
+
+def importPlottingModules(backend='Agg', profile=False):
+    global importProfile, plt, pd, table
+
+    if plt is not None:
+        return
+
+    importProfile = profile
+    timings = []
+
+    timedImport("matplotlib", timings).use(backend)
+    plt = timedImport("matplotlib.pyplot", timings)
+    pd = timedImport("pandas", timings)
+    table = timedImport("pandas.plotting", timings).table
+
+    if profile:
+        printImportProfile(timings)
+
+
+def importLinePlotModules():
+    # seaborn pulls in scipy, the coverage table needs neither
+    global gmean, sns
+
+    if sns is not None:
+        return
+
+    timings = []
+
+    sns = timedImport("seaborn", timings)
+    gmean = timedImport("scipy.stats", timings).gmean
+
+    if importProfile:
+        printImportProfile(timings)
+
 #_ = totalInstance
 
 
+def aggregateLineDf(dataframe, xAxis, yAxis, hue):
+    # mean and normal approximation 95% confidence interval per line and x
+    lineDf = dataframe.groupby([hue, xAxis])[yAxis].agg(
+        ["mean", "std", "count"]).reset_index()
+    lineDf["ci"] = 1.96 * lineDf["std"] / np.sqrt(lineDf["count"])
+
+    return lineDf.rename(columns={"mean": yAxis})
+
+
 def makeLinePlot(xAxis, yAxis, dataframe, hue,
                  xLabel, yLabel, _totalInstance,
                  outputName, colorDict, title,
-                 showSolvedInstance=True, useLogScale=True):
+                 showSolvedInstance=True, useLogScale=True,
+                 errorMode="normal"):
+    importLinePlotModules()
+
     sns.set(rc={
         'figure.figsize': (13, 10),
         'font.size': 27,
@@ -129,19 +266,32 @@ def makeLinePlot(xAxis, yAxis, dataframe, hue,
     mean_df = mean_df.sort_values(by=[yAxis], ascending=False)
     hue_order_list = mean_df[hue]
 
+    # seaborn bootstraps a confidence interval over every raw point;
+    # normal mode hands it one pre-aggregated point per line and x instead
+    plotDf = dataframe
+    if errorMode == "normal":
+        plotDf = aggregateLineDf(dataframe, xAxis, yAxis, hue)
+
     ax = sns.lineplot(x=xAxis,
                       y=yAxis,
                       hue=hue,
                       hue_order=hue_order_list,
                       style=hue,
                       palette=colorDict,
-                      data=dataframe,
+                      data=plotDf,
                       err_style="bars",
+                      errorbar=("ci", 95) if errorMode == "bootstrap" else None,
                       # estimator=gmean,
                       # ci=None,
                       dashes=False
                       )
 
+    if errorMode == "normal":
+        for level in hue_order_list:
+            levelDf = plotDf[plotDf[hue] == level]
+            ax.errorbar(levelDf[xAxis], levelDf[yAxis], yerr=levelDf["ci"],
+                        fmt='none', ecolor=colorDict.get(level))
+
     ax.tick_params(colors='black', labelsize=24)
 
     if showSolvedInstance:
@@ -172,318 +322,258 @@ def makeLinePlot(xAxis, yAxis, dataframe, hue,
     plt.cla()
 
 
-def makePairWiseDf(rawdf, baseline, algorithms):
-    df = pd.DataFrame()
-    df["Algorithm"] = np.nan
-    df["instance"] = np.nan
-    df["boundValues"] = np.nan
-    df["nodeGen"] = np.nan
-    df["nodeExp"] = np.nan
-    df["cpu"] = np.nan
+def solvedByAllDf(rawdf, boundValues, algorithms):
+    # keep instances solved by all algorithms across all bounds
+    solvedCount = rawdf.groupby("instance")["instance"].transform("size")
+    return rawdf[solvedCount == len(algorithms) * len(boundValues)]
+
 
+def makePairWiseDf(rawdf, baseline, algorithms, metric="nodeGen"):
     BaselineDf = rawdf[rawdf["Algorithm"] == baseline]
 
     # print("baseline data count, ", len(BaselineDf))
 
-    for instance in BaselineDf["instance"].unique():
-        dfins = rawdf[rawdf["instance"] == instance]
-        # keep instances solved by all algorithms across all bounds
-        if len(dfins) == len(algorithms) * len(BaselineDf["boundValues"].unique()):
-            df = df.append(dfins)
-
-    # for instance in BaselineDf["instance"].unique():
-        # for boundP in BaselineDf["boundValues"].unique():
-            # # print(instance, boundP)
-            # dfins = rawdf[(rawdf["instance"] == instance) &
-            # (rawdf["boundValues"] == boundP)]
-            # if len(dfins) == len(algorithms):  # keep instances solved by all algorithms
-            # df = df.append(dfins)
-
-    boundPercents = BaselineDf["boundValues"].unique()
-    boundPercents.sort()
-    for boundP in boundPercents:
-        print("bound percent ", boundP, "valid instances: ", len(
-            df[df["boundValues"] == boundP]["instance"].unique()), "baseline avg:",
-            df[(df["boundValues"] == boundP) &
-               (df["Algorithm"] == baseline)]["nodeGen"].mean())
-
-    differenceNodeGen = []
-
-    for rowdata in df.iterrows():
-        row = rowdata[1]
-        relateastar = df[(df["instance"] == row['instance']) &
-                         (df["Algorithm"] == baseline) &
-                         (df["boundValues"] == row['boundValues'])]
-        if relateastar.empty:
-            print("error! baseline not found")
-            differenceNodeGen.append(np.nan)
-        else:
-            diffNodeGen = row['nodeGen'] / relateastar['nodeGen']
-            # print("row",row)
-            # print("relateastar",relateastar)
-            diffNodeGen = diffNodeGen.values[0]
-            differenceNodeGen.append(diffNodeGen)
-
-    df["nodeGenDiff"] = differenceNodeGen
-
-    return df
+    df = solvedByAllDf(rawdf[rawdf["instance"].isin(BaselineDf["instance"])],
+                       BaselineDf["boundValues"].unique(), algorithms)
 
+    # one keyed join against the baseline run of the same instance and bound
+    baselineValues = df.loc[df["Algorithm"] == baseline,
+                            ["instance", "boundValues", metric]].rename(
+                                columns={metric: "baselineValue"})
+    df = df.merge(baselineValues, on=["instance", "boundValues"], how="left",
+                  validate="many_to_one")
 
-def allSolvedDf(rawdf):
-    df = pd.DataFrame()
-    df["Algorithm"] = np.nan
-    df["instance"] = np.nan
-    df["boundValues"] = np.nan
-    df["nodeGen"] = np.nan
-    df["nodeExp"] = np.nan
-    df["cpu"] = np.nan
+    missing = df["baselineValue"].isna().sum()
+    if missing:
+        print("error! baseline not found for", missing, "rows")
 
-    algorithms = rawdf["Algorithm"].unique()
+    summary = df.groupby("boundValues").agg(
+        instances=("instance", "nunique"))
+    summary["baselineAvg"] = df[df["Algorithm"] == baseline].groupby(
+        "boundValues")[metric].mean()
+    for boundP in sorted(summary.index):
+        print("bound percent ", boundP, "valid instances: ",
+              summary.at[boundP, "instances"],
+              "baseline avg:", summary.at[boundP, "baselineAvg"])
 
-    for instance in rawdf["instance"].unique():
-        dfins = rawdf[rawdf["instance"] == instance]
-        # keep instances solved by all algorithms across all bounds
-        if len(dfins) == len(algorithms) * len(rawdf["boundValues"].unique()):
-            df = df.append(dfins)
+    df[metric + "Diff"] = df[metric] / df["baselineValue"]
 
-    # for instance in rawdf["instance"].unique():
-        # for boundP in rawdf["boundValues"].unique():
-            # # print(instance, boundP)
-            # dfins = rawdf[(rawdf["instance"] == instance) &
-            # (rawdf["boundValues"] == boundP)]
+    return df.drop(columns="baselineValue")
 
-            # if len(dfins) == len(algorithms):  # keep instances solved by all algorithms
-            # df = df.append(dfins)
 
+def allSolvedDf(rawdf):
     boundValues = rawdf["boundValues"].unique()
-    boundValues.sort()
-    for boundV in boundValues:
-        print("bound percent ", boundV, "valid instances: ", len(
-            df[df["boundValues"] == boundV]["instance"].unique()))
+    df = solvedByAllDf(rawdf, boundValues, rawdf["Algorithm"].unique())
+
+    validInstances = df.groupby("boundValues")["instance"].nunique()
+    for boundV in sorted(boundValues):
+        print("bound percent ", boundV, "valid instances: ",
+              validInstances.get(boundV, 0))
 
     return df
 
 
-def makePar10Df(rawdf, totalInstance):
+def makeSummaryDf(rawdf, totalInstance, timeLimit=600):
+    # one groupby pass over the results, every algorithm x bound cell
+    # present, cells without a solved instance included
+    algorithms = rawdf["Algorithm"].unique()
+    boundValues = np.sort(rawdf["boundValues"].unique())
+    cells = pd.MultiIndex.from_product([algorithms, boundValues],
+                                       names=["Algorithm", "boundValues"])
 
-    par10Algorithm = []
-    par10BoundValue = []
-    par10Cpu = []
-    par10Instance = []
-    par10NodeExpanded = []
-    par10NodeGenerated = []
+    summary = rawdf.groupby(["Algorithm", "boundValues"]).agg(
+        solved=("instance", "size"),
+        cpuSum=("cpu", "sum"),
+    ).reindex(cells, fill_value=0)
 
-    boundValues = rawdf["boundValues"].unique()
-    boundValues.sort()
-    algorithms = rawdf["Algorithm"].unique()
+    summary["unsolved"] = (int(totalInstance) -
+                           summary["solved"]).clip(lower=0)
 
-    maxCPU = rawdf["cpu"].max()
-    maxNodeGen = rawdf["nodeGen"].max()
-    maxNodeExp = rawdf["nodeExp"].max()
-    for alg in algorithms:
-        for boundV in boundValues:
-            dfins = rawdf[(rawdf["Algorithm"] == alg) &
-                          (rawdf["boundValues"] == boundV)]
-            numberUnsolved = int(totalInstance) - len(dfins)
-            if numberUnsolved > 0:
-                for i in range(numberUnsolved):
-                    par10Instance.append("par10-"+str(i))
-                    par10Algorithm.append(alg)
-                    par10BoundValue.append(boundV)
-                    par10Cpu.append(maxCPU*10)
-                    par10NodeGenerated.append(maxNodeGen*10)
-                    par10NodeExpanded.append(maxNodeExp*10)
-
-    par10df = pd.DataFrame({
-        "Algorithm": par10Algorithm,
-        "instance": par10Instance,
-        "boundValues": par10BoundValue,
-        "nodeGen": par10NodeGenerated,
-        "nodeExp": par10NodeExpanded,
-        "cpu": par10Cpu,
-    })
+    penalty = rawdf["cpu"].max() * 10
+    summary["par10Cpu"] = (summary["cpuSum"] + summary["unsolved"] *
+                           penalty) / int(totalInstance)
+    summary["timeLimitCpu"] = (summary["cpuSum"] + summary["unsolved"] *
+                               timeLimit) / int(totalInstance)
 
-    df = pd.DataFrame()
-    df["Algorithm"] = np.nan
-    df["instance"] = np.nan
-    df["boundValues"] = np.nan
-    df["nodeGen"] = np.nan
-    df["nodeExp"] = np.nan
-    df["cpu"] = np.nan
+    return summary.drop(columns="cpuSum")
 
-    df = df.append(rawdf)
-    df = df.append(par10df)
 
-    return df
+def padUnsolvedDf(rawdf, summary, instancePrefix, padValues):
+    # one synthetic row per unsolved instance, built in bulk
+    cells = summary.index.repeat(summary["unsolved"].values)
+    paddf = cells.to_frame(index=False)
+    paddf["instance"] = instancePrefix + paddf.groupby(
+        ["Algorithm", "boundValues"]).cumcount().astype(str)
 
-def makeTimeUpperBoundDf(rawdf, totalInstance):
+    for column, value in padValues.items():
+        paddf[column] = value
 
-    timeLimitAlgorithm = []
-    timeLimitBoundValue = []
-    timeLimitCpu = []
-    timeLimitInstance = []
+    return pd.concat([rawdf, paddf], ignore_index=True)
 
-    boundValues = rawdf["boundValues"].unique()
-    boundValues.sort()
-    algorithms = rawdf["Algorithm"].unique()
 
-    for alg in algorithms:
-        for boundV in boundValues:
-            dfins = rawdf[(rawdf["Algorithm"] == alg) &
-                          (rawdf["boundValues"] == boundV)]
-            numberUnsolved = int(totalInstance) - len(dfins)
-            if numberUnsolved > 0:
-                for i in range(numberUnsolved):
-                    timeLimitInstance.append("TimeLimitReached-"+str(i))
-                    timeLimitAlgorithm.append(alg)
-                    timeLimitBoundValue.append(boundV)
-                    timeLimitCpu.append(600)
-
-    timeLimitdf = pd.DataFrame({
-        "Algorithm": timeLimitAlgorithm,
-        "instance": timeLimitInstance,
-        "boundValues": timeLimitBoundValue,
-        "cpu": timeLimitCpu,
+def makePar10Df(rawdf, totalInstance):
+    summary = makeSummaryDf(rawdf, totalInstance)
+    print(summary[["solved", "par10Cpu"]])
+
+    return padUnsolvedDf(rawdf, summary, "par10-", {
+        "nodeGen": rawdf["nodeGen"].max() * 10,
+        "nodeExp": rawdf["nodeExp"].max() * 10,
+        "cpu": rawdf["cpu"].max() * 10,
     })
 
-    df = pd.DataFrame()
-    df["Algorithm"] = np.nan
-    df["instance"] = np.nan
-    df["boundValues"] = np.nan
-    df["cpu"] = np.nan
 
-    df = df.append(rawdf)
-    df = df.append(timeLimitdf)
+def makeTimeUpperBoundDf(rawdf, totalInstance, timeLimit=600):
+    summary = makeSummaryDf(rawdf, totalInstance, timeLimit)
+    print(summary[["solved", "timeLimitCpu"]])
 
-    return df
+    return padUnsolvedDf(rawdf, summary, "TimeLimitReached-",
+                         {"cpu": timeLimit})
+
+
+def storePath(args):
+    resultDir = "results"
+
+    return resultStore.storeDirectory("../../../" + resultDir, args.domain,
+                                      args.subdomain, args.heuristicType)
 
 
-def readData(args, algorithms, domainBoundsConfig):
+def openStore(args, inPath):
+    # every algorithm directory is ingested, not only the plotted ones, and
+    # the mtime check makes this cheap when no new runs landed; -u rebuilds
+    # the store from scratch
+    return resultStore.ingest(inPath, rebuild=args.updateStore)
+
+
+def queryData(args, algorithms, stores=None):
     domainSize = args.size
     domainType = args.domain
-    subdomainType = args.subdomain
 
-    algorithm = []
-    boundValue = []
-    cpu = []
-    instance = []
-    nodeExpanded = []
-    nodeGenerated = []
-
-    print("reading in data...")
+    inPath = storePath(args)
 
-    resultDir = "results"
+    # a compendium opens each store once and shares it between figures
+    if stores is not None and inPath in stores:
+        store = stores[inPath]
+    else:
+        store = openStore(args, inPath)
+        if stores is not None:
+            stores[inPath] = store
 
-    domainDir = domainType
+    result = resultStore.queryStore(
+        store,
+        algorithms=algorithms.keys(),
+        lookaheadStart=int(args.lookaheadStart),
+        lookaheadEnd=int(args.lookaheadEnd),
+        size=domainSize if domainType == "pancake" else None)
 
-    inPath = "../../../" + resultDir + "/" + \
-        domainDir + "/" + subdomainType
+    return result
 
-    if domainType in ["racetrack", "pancake"]:
-        inPath += "/"+args.heuristicType
 
-    inPath += '/alg'
+def readData(args, algorithms, stores=None):
+    print("reading in data...")
 
-    for alg in algorithms:
-        print("reading ", alg)
+    result = queryData(args, algorithms, stores)
 
-        inPath_alg = inPath.replace('alg', alg)
-        for jsonFile in os.listdir(inPath_alg):
-            if jsonFile[-5:] != ".json":
-                continue
+    rawdf = pd.DataFrame({
+        "Algorithm": [algorithms[alg] for alg in result["algorithm"]],
+        "instance": result["instance"],
+        "boundValues": result["lookahead"],
+
+        "nodeGen": result["nodeGen"],
+        "nodeExp": result["nodeExp"],
+        "GATnodeExp": result["GATnodeExp"],
+        "cpu": result["cpu"],
+        "solutionCost": result["solutionCost"],
+        "solutionLength": result["solutionLength"],
+        "epsilonHGlobal": result["epsilonHGlobal"],
+        "epsilonDGlobal": result["epsilonDGlobal"],
+    })
 
-            numbersInFileName = re.findall(r'\d*\.?\d+', jsonFile)
-            sizeStr = numbersInFileName[1]
+    # print rawdf
+    return rawdf
 
-            if domainType == "pancake" and sizeStr != domainSize:
-                continue
 
-            boundValueStr = numbersInFileName[0]
-            boundV = float(boundValueStr)
+def readStepData(args, algorithms, stores=None):
+    print("reading in per step data...")
 
-            lowerBound = float(args.boundPercentStart)
-            upperBound = float(args.boundPercentEnd)
-            allAvailableBoundValue = \
-                domainBoundsConfig["avaiableBoundPercent"][args.domain][args.subdomain]
+    result = queryData(args, algorithms, stores)
 
-            if(boundV < lowerBound or
-               boundV > upperBound or
-               (boundV not in allAvailableBoundValue)):
-                continue
+    # one row per lookahead iteration of every run
+    rows = resultStore.stepRows(result, "lookaheadCpuTime")
 
-            try:
-                with open(inPath_alg + "/" + jsonFile) as json_data:
+    stepdf = pd.DataFrame({
+        "Algorithm": [algorithms[alg] for alg in result["algorithm"][rows]],
+        "instance": result["instance"][rows],
+        "boundValues": result["lookahead"][rows],
+        "run": rows,
+        "stepCpu": result["lookaheadCpuTime"],
+    })
 
-                    resultData = json.load(json_data)
+    return stepdf
 
-                    # if alg == "ptsnancy":
-                    # if alg == "ptsnancy" and resultData["node generated"] > 1000:
-                    # print("reading ", alg, jsonFile, "generated: ",
-                    # resultData["node generated"])
 
-                    # if alg == "ptsnancy" and resultData["node generated"] > 1000:
-                    # continue
+def makeLatencyDf(stepdf, deadline=None):
+    # per step latency percentiles per algorithm and lookahead, real-time
+    # search is judged on its worst steps, not on the total
+    grouped = stepdf.groupby(["Algorithm", "boundValues"])["stepCpu"]
 
-                    algorithm.append(algorithms[alg])
-                    boundValue.append(boundV)
-                    cpu.append(resultData["cpu time"])
-                    instance.append(resultData["instance"])
-                    nodeExpanded.append(resultData["node expanded"])
-                    nodeGenerated.append(resultData["node generated"])
-            except JSONDecodeError as e:
-                print("json error:", e)
-                print("when reading ", alg, jsonFile)
-                sys.exit(1)
+    latencydf = grouped.quantile([0.5, 0.95, 0.99]).unstack()
+    latencydf.columns = ["p50", "p95", "p99"]
+    latencydf["max"] = grouped.max()
+    latencydf["steps"] = grouped.size()
+    latencydf["runs"] = stepdf.groupby(
+        ["Algorithm", "boundValues"])["run"].nunique()
 
-    rawdf = pd.DataFrame({
-        "Algorithm": algorithm,
-        "instance": instance,
-        "boundValues": boundValue,
+    if deadline is not None:
+        violated = (stepdf["stepCpu"] > deadline).groupby(
+            [stepdf["Algorithm"], stepdf["boundValues"]])
+        latencydf["violationRate"] = violated.mean()
+        # runs with at least one step over the deadline
+        latencydf["violatedRunRate"] = (
+            (stepdf["stepCpu"] > deadline)
+            .groupby([stepdf["Algorithm"], stepdf["boundValues"],
+                      stepdf["run"]]).any()
+            .groupby(level=["Algorithm", "boundValues"]).mean())
 
-        "nodeGen": nodeGenerated,
-        "nodeExp": nodeExpanded,
-        "cpu": cpu,
-    })
+    return latencydf.reset_index()
 
-    # print rawdf
-    return rawdf
 
-def makeCoverageTable(df, args, totalInstance):
-    out_file = createOutFilePrefix(args) + args.plotType+".jpg"
+def makeLatencyAnalysis(stepdf, args, showname, colorDict, totalInstance):
+    deadline = None if args.deadline == 'NA' else float(args.deadline)
 
-    algs = []
+    latencydf = makeLatencyDf(stepdf, deadline)
 
-    boundSolved = {}
+    outFilePrefix = createOutFilePrefix(args) + args.plotType
 
-    boundStr = df["boundValues"].unique()
-    bounds = [float(i) for i in boundStr]
-    bounds.sort()
+    print(latencydf.to_string(index=False))
+    latencydf.to_csv(outFilePrefix + ".csv", index=False)
 
-    for cbound in bounds:
-        boundSolved[str(cbound)] = []
+    # worst step of every run, averaged over the instances
+    rundf = stepdf.groupby(["Algorithm", "boundValues", "run"]).agg(
+        instance=("instance", "first"),
+        maxStepCpu=("stepCpu", "max")).reset_index()
 
-    for alg in df["Algorithm"].unique():
+    makeLinePlot("boundValues", "maxStepCpu", rundf, "Algorithm",
+                 showname["boundValues"], showname["maxStepCpu"],
+                 totalInstance, outFilePrefix + ".jpg", colorDict,
+                 createTitle(args), showSolvedInstance=False,
+                 errorMode=args.errorMode)
 
-        algs.append(alg)
+def makeCoverageTable(df, args, totalInstance):
+    out_file = createOutFilePrefix(args) + args.plotType+".jpg"
 
-        for cbound in df["boundValues"].unique():
-            dfins = df[(df["Algorithm"] == alg) & (
-                df["boundValues"] == cbound)]
-            boundSolved[str(float(cbound))].append(
-                str(len(dfins))+"/"+totalInstance)
+    solved = makeSummaryDf(df, totalInstance)["solved"].unstack()
+    solved.columns = [str(float(cbound)) for cbound in solved.columns]
 
-    data = {"Algorihtm": algs}
-    data.update(boundSolved)
+    tabledf = (solved.astype(str) + "/" + totalInstance).rename_axis(
+        "Algorihtm").reset_index()
 
-    nrows, ncols = len(algs)+1, len(bounds)
+    nrows, ncols = len(tabledf)+1, len(solved.columns)
     hcell, wcell = 0.3, 1
     hpad, wpad = 0, 0
     fig = plt.figure(figsize=(ncols*wcell+wpad, nrows*hcell+hpad))
     ax = fig.add_subplot(111)
     ax.axis('off')
 
-    tabledf = pd.DataFrame(data)
-
     # ax = plt.subplot(frame_on=False)  # no visible frame
     ax.xaxis.set_visible(False)  # hide the x axis
     ax.yaxis.set_visible(False)  # hide the y axis
@@ -491,32 +581,18 @@ def makeCoverageTable(df, args, totalInstance):
     table(ax, tabledf, loc='center')  # where tabledf is your data frame
 
     plt.savefig(out_file, dpi=200)
+    plt.close(fig)
 
 def makeCoveragePlot(df, args, totalInstance, showname, colorDict):
-    algs = []
-    bound = []
-    solved = []
-
-    for alg in df["Algorithm"].unique():
-        for cbound in df["boundValues"].unique():
-            algs.append(alg)
-            bound.append(cbound)
-            dfins = df[(df["Algorithm"] == alg) & (
-                df["boundValues"] == cbound)]
-            solved.append(len(dfins))
-
-    rawdf = pd.DataFrame({
-        "Algorithm": algs,
-        "boundValues": bound,
-        "solved": solved
-    })
+    rawdf = makeSummaryDf(df, totalInstance)["solved"].reset_index()
 
     makeLinePlot("boundValues", "solved", rawdf, "Algorithm",
                  showname["boundValues"],
                  showname["solved"].replace(
                      "totalInstance", totalInstance), totalInstance,
                  createOutFilePrefix(args) + args.plotType+".jpg", colorDict,
-                 createTitle(args), showSolvedInstance=False, useLogScale=False)
+                 createTitle(args), showSolvedInstance=False, useLogScale=False,
+                 errorMode=args.errorMode)
 
 
 def createOutFilePrefix(args):
@@ -576,7 +652,9 @@ def createTitle(args):
     return title[args.domain][args.subdomain]
 
 
-def plotting(args, config):
+def plotting(args, config, stores=None):
+    importPlottingModules(args.backend, args.profileImports)
+
     print("building plots...")
 
     algorithms = config.getAlgorithms(args.removeAlgorithm)
@@ -584,7 +662,14 @@ def plotting(args, config):
     showname = config.getShowname()
     totalInstance = config.getTotalInstance()
 
-    rawdf = readData(args, algorithms, config.getDomainBoundsConfig())
+    if args.plotType == "latency":
+        stepdf = readStepData(args, algorithms, stores)
+        makeLatencyAnalysis(stepdf, args, showname,
+                            config.getAlgorithmColor(),
+                            totalInstance[args.domain])
+        return
+
+    rawdf = readData(args, algorithms, stores)
 
     if args.plotType == "coveragetb":
         makeCoverageTable(rawdf, args, totalInstance[args.domain])
@@ -599,7 +684,8 @@ def plotting(args, config):
                      showname["boundValues"],
                      "Par10 CPU Time", totalInstance[args.domain],
                      createOutFilePrefix(args) + args.plotType+".jpg",
-                     config.getAlgorithmColor(), createTitle(args), showSolvedInstance=False)
+                     config.getAlgorithmColor(), createTitle(args), showSolvedInstance=False,
+                     errorMode=args.errorMode)
     elif args.plotType == "timelimitcpu":
 
         df = makeTimeUpperBoundDf(rawdf, totalInstance[args.domain])
@@ -608,7 +694,31 @@ def plotting(args, config):
                      showname["boundValues"],
                      "raw CPU Time", totalInstance[args.domain],
                      createOutFilePrefix(args) + args.plotType+".jpg",
-                     config.getAlgorithmColor(), createTitle(args), showSolvedInstance=False)
+                     config.getAlgorithmColor(), createTitle(args), showSolvedInstance=False,
+                     errorMode=args.errorMode)
+
+    elif args.plotType == "fixedbaseline" or args.plotType.endswith("Diff"):
+        metric = args.pairWiseMetric
+        if args.plotType != "fixedbaseline":
+            metric = args.plotType[:-len("Diff")]
+
+        baseline = list(algorithms.values())[0]
+        if args.baseline != 'NA':
+            baseline = algorithms[args.baseline]
+
+        df = makePairWiseDf(rawdf, baseline, rawdf["Algorithm"].unique(),
+                            metric)
+
+        yAxis = metric + "Diff"
+
+        # the ratios stay raw for the gmean legend order, only the axis is
+        # log scaled
+        makeLinePlot("boundValues", yAxis, df, "Algorithm",
+                     showname["boundValues"], showname[yAxis],
+                     totalInstance[args.domain],
+                     createOutFilePrefix(args) + args.plotType+".jpg",
+                     config.getAlgorithmColor(), createTitle(args),
+                     errorMode=args.errorMode)
 
     else:
         df = allSolvedDf(rawdf)
@@ -616,7 +726,71 @@ def plotting(args, config):
                      showname["boundValues"], showname[args.plotType],
                      totalInstance[args.domain],
                      createOutFilePrefix(args) + args.plotType+".jpg",
-                     config.getAlgorithmColor(), createTitle(args))
+                     config.getAlgorithmColor(), createTitle(args),
+                     errorMode=args.errorMode)
+
+
+def readCompendiumSpecs(parser, args):
+    specs = []
+
+    with open(args.compendium) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            spec = parser.parse_args(shlex.split(line))
+
+            # all figures of one compendium land in the same directory
+            if spec.outTime == 'NA':
+                spec.outTime = args.outTime
+            spec.updateStore = spec.updateStore or args.updateStore
+
+            specs.append(spec)
+
+    return specs
+
+
+# shared with the forked rendering processes
+compendiumConfig = None
+compendiumStores = {}
+
+
+def renderSpec(spec):
+    try:
+        plotting(spec, compendiumConfig, compendiumStores)
+        return True
+    except Exception as e:
+        print("failed to render", spec, e)
+        return False
+
+
+def compendium(parser, args):
+    global compendiumConfig
+
+    if args.outTime == 'NA':
+        args.outTime = datetime.now().strftime("%Y%m%d-%H%M%S")
+
+    specs = readCompendiumSpecs(parser, args)
+    compendiumConfig = Configure()
+
+    # imported once here, the forked workers inherit them
+    importPlottingModules(args.backend, args.profileImports)
+    importLinePlotModules()
+
+    # read every store before forking, the workers only query them
+    for spec in specs:
+        inPath = storePath(spec)
+        if inPath not in compendiumStores:
+            compendiumStores[inPath] = openStore(spec, inPath)
+
+    if args.processes > 1:
+        with multiprocessing.get_context("fork").Pool(args.processes) as pool:
+            rendered = pool.map(renderSpec, specs, chunksize=1)
+    else:
+        rendered = [renderSpec(spec) for spec in specs]
+
+    print("rendered", sum(rendered), "of", len(specs), "figures")
 
 
 def main():
@@ -624,6 +798,10 @@ def main():
     args = parser.parse_args()
     print(args)
 
+    if args.compendium != 'NA':
+        compendium(parser, args)
+        return
+
     plotting(args, Configure())
 
 
@@ -71,7 +71,20 @@ class Configure:
                          "nodeGenDiff": "Algorithm Node Generated /  baseline Node Generated",
                          "fixedbaseline":
                          "log10 (Algorithm Node Generated /  baseline Node Generated)",
+                         "nodeExpDiff": "Algorithm Node Expanded /  baseline Node Expanded",
+                         "GATnodeExp": "Total GAT Nodes Expanded",
+                         "GATnodeExpDiff":
+                         "Algorithm GAT Node Expanded /  baseline GAT Node Expanded",
                          "cpu": "Raw CPU Time",
+                         "cpuDiff": "Algorithm CPU Time /  baseline CPU Time",
+                         "solutionCost": "Solution Cost",
+                         "solutionCostDiff": "Algorithm Solution Cost /  baseline Solution Cost",
+                         "solutionLength": "Solution Length",
+                         "solutionLengthDiff":
+                         "Algorithm Solution Length /  baseline Solution Length",
+                         "maxStepCpu": "Worst Step CPU Time",
+                         "epsilonHGlobal": "Global One-Step Heuristic Error",
+                         "epsilonDGlobal": "Global One-Step Distance Error",
                          "solved": "Number of Solved Instances (Total=totalInstance)",
                          "boundValues": "Suboptimality",
                          }
@@ -102,11 +115,9 @@ class Configure:
                                    }
 
     def getAlgorithms(self, removeAlgorithm):
-        if removeAlgorithm:
-            for rmAlg in removeAlgorithm:
-                if rmAlg in self.algorithms:
-                    self.algorithms.pop(rmAlg)
-        return self.algorithms
+        # a filtered copy, one Configure serves every figure of a compendium
+        return OrderedDict((alg, name) for alg, name in self.algorithms.items()
+                           if alg not in removeAlgorithm)
 
     def getShowname(self):
         return self.showname
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+'''
+python3 script
+columnar result store for realtime solver performance records
+
+ingest the per-run json files written by realtimeSolver -o into one typed
+numpy .npz store per domain/subdomain, so plotting does not need to walk
+and re-parse the result tree each time.
+'''
+
+import argparse
+import json
+import os
+import re
+import tempfile
+from json.decoder import JSONDecodeError
+
+import numpy as np
+
+storeFileName = "resultStore.npz"
+
+# column name -> (record key, dtype, missing value)
+recordColumns = {
+    "instance": ("instance", np.str_, ""),
+    "lookahead": ("lookahead", np.int64, -1),
+    "nodeExp": ("node expanded", np.int64, -1),
+    "GATnodeExp": ("GAT node expanded", np.int64, -1),
+    "nodeGen": ("node generated", np.int64, -1),
+    "solutionFound": ("solution found", np.bool_, False),
+    "solutionCost": ("solution cost", np.float64, np.nan),
+    "solutionLength": ("solution length", np.float64, np.nan),
+    "cpu": ("cpu time", np.float64, np.nan),
+    "epsilonHGlobal": ("epsilon h global", np.float64, np.nan),
+    "epsilonDGlobal": ("epsilon d global", np.float64, np.nan),
+}
+
+# per step columns, a list per record: column name -> (record key, dtype);
+# the values of all rows are stored back to back in column, and the
+# per row number of values in column + "Count"
+stepColumns = {
+    "lookaheadCpuTime": ("lookahead cpu time", np.float64),
+}
+
+# bookkeeping columns, not from the record itself
+fileColumns = {
+    "algorithm": np.str_,
+    "size": np.str_,
+    "resultFile": np.str_,
+    "mtime": np.float64,
+}
+
+
+def parseArugments():
+
+    parser = argparse.ArgumentParser(description='resultStore')
+
+    parser.add_argument(
+        '-d',
+        action='store',
+        dest='domain',
+        help='domain: tile(default), pancake, racetrack, gridPathfinding',
+        default='tile')
+
+    parser.add_argument(
+        '-s',
+        action='store',
+        dest='subdomain',
+        help='subdomain: tile: uniform(default), heavy, inverse; \
+        pancake: regular, heavy; \
+        racetrack : barto-bigger, hansen-bigger',
+        default='uniform')
+
+    parser.add_argument(
+        '-ht',
+        action='store',
+        dest='heuristicType',
+        help='heuristic type: racetrack:euclidean(default), dijkstra, \
+              gap, gapm1, gapm2',
+        default='euclidean')
+
+    parser.add_argument(
+        '-a',
+        action='append',
+        dest='algorithms',
+        help='algorithms to ingest, default(all algorithm directories)',
+        default=[])
+
+    parser.add_argument(
+        '-r',
+        action='store',
+        dest='resultDir',
+        help='result root directory (default: ../../../results)',
+        default='../../../results')
+
+    return parser
+
+
+def storeDirectory(resultDir, domain, subdomain, heuristicType):
+    storeDir = resultDir + "/" + domain + "/" + subdomain
+
+    if domain in ["racetrack", "pancake"]:
+        storeDir += "/" + heuristicType
+
+    return storeDir
+
+
+def emptyStore():
+    store = {}
+    for column, (_, dtype, _) in recordColumns.items():
+        store[column] = np.array([], dtype=dtype)
+    for column, dtype in fileColumns.items():
+        store[column] = np.array([], dtype=dtype)
+    for column, (_, dtype) in stepColumns.items():
+        store[column] = np.array([], dtype=dtype)
+        store[column + "Count"] = np.array([], dtype=np.int64)
+    return store
+
+
+def loadStore(storeDir):
+    storeFile = storeDir + "/" + storeFileName
+
+    if not os.path.exists(storeFile):
+        return None
+
+    with np.load(storeFile, allow_pickle=False) as data:
+        store = {column: data[column] for column in data.files}
+
+    # stores written before a column existed get it filled with its
+    # missing value
+    numberOfRows = len(store["resultFile"])
+    for column, (_, dtype, missing) in recordColumns.items():
+        if column not in store:
+            store[column] = np.full(numberOfRows, missing, dtype=dtype)
+    for column, (_, dtype) in stepColumns.items():
+        if column not in store:
+            store[column] = np.array([], dtype=dtype)
+            store[column + "Count"] = np.zeros(numberOfRows, dtype=np.int64)
+
+    return store
+
+
+def saveStore(storeDir, store):
+    # write to a temp file first so a reader never sees a half written store
+    fd, tmpFile = tempfile.mkstemp(dir=storeDir, suffix=".npz.tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **store)
+        os.replace(tmpFile, storeDir + "/" + storeFileName)
+    except BaseException:
+        os.remove(tmpFile)
+        raise
+
+
+def readRecord(jsonFile):
+    with open(jsonFile) as jsonData:
+        return json.load(jsonData)
+
+
+def recordsToColumns(records):
+    columns = {}
+    for column, (key, dtype, missing) in recordColumns.items():
+        columns[column] = np.array(
+            [record[0].get(key, missing) for record in records], dtype=dtype)
+
+    columns["algorithm"] = np.array([record[1] for record in records],
+                                    dtype=np.str_)
+    columns["size"] = np.array([record[2] for record in records],
+                               dtype=np.str_)
+    columns["resultFile"] = np.array([record[3] for record in records],
+                               dtype=np.str_)
+    columns["mtime"] = np.array([record[4] for record in records],
+                                dtype=np.float64)
+
+    for column, (key, dtype) in stepColumns.items():
+        # older solvers wrote no per step values, or a single total
+        steps = [record[0].get(key) for record in records]
+        steps = [values if isinstance(values, list) else []
+                 for values in steps]
+        columns[column + "Count"] = np.array([len(values) for values in steps],
+                                             dtype=np.int64)
+        columns[column] = np.fromiter(
+            (value for values in steps for value in values), dtype=dtype,
+            count=int(columns[column + "Count"].sum()))
+    return columns
+
+
+def selectRows(store, mask):
+    selected = {}
+    for column, values in store.items():
+        if column in stepColumns:
+            # a row keeps all of its step values
+            selected[column] = values[np.repeat(mask,
+                                                store[column + "Count"])]
+        else:
+            selected[column] = values[mask]
+    return selected
+
+
+def stepRows(store, column):
+    # row index of every value of the per step column
+    counts = store[column + "Count"]
+    return np.repeat(np.arange(len(counts)), counts)
+
+
+def algorithmDirectories(storeDir):
+    # every algorithm has its own directory of result files
+    if not os.path.isdir(storeDir):
+        return []
+
+    return [alg for alg in sorted(os.listdir(storeDir))
+            if os.path.isdir(storeDir + "/" + alg)]
+
+
+def ingest(storeDir, algorithms=None, rebuild=False):
+    '''
+    parse only the json files that are new or changed since the last ingest
+    and append them to the store of storeDir, and drop the rows of the
+    ingested algorithms whose file is gone; returns the updated store.
+    rebuild ignores the existing store and parses every file again
+    '''
+    store = None if rebuild else loadStore(storeDir)
+    if store is None:
+        store = emptyStore()
+
+    if not os.path.isdir(storeDir):
+        print("not found, skip ", storeDir)
+        return store
+
+    ingested = dict(zip(store["resultFile"], store["mtime"]))
+
+    # without a list every algorithm directory is scanned, so the rows of
+    # one that was deleted go as well
+    scanAll = not algorithms
+    if scanAll:
+        algorithms = algorithmDirectories(storeDir)
+
+    records = []
+    staleFiles = set()
+    scannedAlgorithms = []
+    seenFiles = set()
+
+    for alg in algorithms:
+        algDir = storeDir + "/" + alg
+        if not os.path.isdir(algDir):
+            print("not found, skip ", alg)
+            continue
+
+        scannedAlgorithms.append(alg)
+        with os.scandir(algDir) as entries:
+            for entry in entries:
+                if entry.name[-5:] != ".json":
+                    continue
+
+                relativeFile = alg + "/" + entry.name
+                seenFiles.add(relativeFile)
+                mtime = entry.stat().st_mtime
+
+                if ingested.get(relativeFile) == mtime:
+                    continue
+
+                try:
+                    resultData = readRecord(entry.path)
+                except (JSONDecodeError, UnicodeDecodeError, OSError) as e:
+                    print("json error:", e)
+                    print("when reading ", alg, entry.name)
+                    continue
+
+                if relativeFile in ingested:
+                    staleFiles.add(relativeFile)
+
+                sizeStr = re.findall(r'size-(\d+)', entry.name)
+                records.append((resultData, alg,
+                                sizeStr[0] if sizeStr else "",
+                                relativeFile, mtime))
+
+    # rows of a scanned algorithm whose file was deleted; a listed
+    # algorithm whose directory is missing keeps its rows
+    deleted = ~np.isin(store["resultFile"], list(seenFiles))
+    if not scanAll:
+        deleted &= np.isin(store["algorithm"], scannedAlgorithms)
+    if deleted.any():
+        print("dropping", int(deleted.sum()), "records of deleted files")
+        store = selectRows(store, ~deleted)
+
+    if not records:
+        if rebuild or deleted.any():
+            saveStore(storeDir, store)
+        return store
+
+    print("ingesting", len(records), "new records into", storeDir)
+
+    if staleFiles:
+        keep = ~np.isin(store["resultFile"], list(staleFiles))
+        store = selectRows(store, keep)
+
+    newColumns = recordsToColumns(records)
+    store = {column: np.concatenate([store[column], newColumns[column]])
+             for column in store}
+
+    saveStore(storeDir, store)
+
+    return store
+
+
+def queryStore(store, algorithms=None, lookaheadStart=None,
+               lookaheadEnd=None, size=None, solvedOnly=False):
+    mask = np.ones(len(store["resultFile"]), dtype=bool)
+
+    if algorithms is not None:
+        mask &= np.isin(store["algorithm"], list(algorithms))
+    if lookaheadStart is not None:
+        mask &= store["lookahead"] >= lookaheadStart
+    if lookaheadEnd is not None:
+        mask &= store["lookahead"] <= lookaheadEnd
+    if size is not None:
+        mask &= store["size"] == size
+    if solvedOnly:
+        mask &= store["solutionFound"]
+
+    return selectRows(store, mask)
+
+
+def main():
+    parser = parseArugments()
+    args = parser.parse_args()
+    print(args)
+
+    storeDir = storeDirectory(args.resultDir, args.domain, args.subdomain,
+                              args.heuristicType)
+
+    store = ingest(storeDir, args.algorithms)
+
+    print("store rows:", len(store["resultFile"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+'''
+python3 script
+reader of the realtimeSolver visualization output (-v visOut)
+
+the binary format (--visFormat binary, see src/utility/VisWriter.h) is
+memory mapped: the state string table, the iteration offsets and the
+encoded id bytes are numpy views into the file, nothing is copied. the
+state ids are zigzag varint deltas, decoded only on access (iterationIds
+one iteration, decodeIds all of them); the string offsets are found with
+one scan for the '\0's and the keepThinking flags are unpacked from
+their bits when the file is read. json vis files are read into the same
+layout, so callers handle both alike.
+
+eg:
+python visReader.py -i vis.bin
+'''
+
+import argparse
+import json
+
+import numpy as np
+
+visMagic = b"RTV1"
+visVersion = 2
+
+# iteration lists of a vis file, in file order
+visLists = ["path", "visited", "committed"]
+
+headerType = np.dtype([
+    ("magic", "S4"),
+    ("version", "<u4"),
+    ("numStates", "<u4"),
+    ("stringBytes", "<u4"),
+    ("numPaths", "<u4"),
+    ("pathBytes", "<u4"),
+    ("pathIds", "<u4"),
+    ("numVisited", "<u4"),
+    ("visitedBytes", "<u4"),
+    ("visitedIds", "<u4"),
+    ("numCommitted", "<u4"),
+    ("committedBytes", "<u4"),
+    ("committedIds", "<u4"),
+    ("numKeepThinking", "<u4"),
+])
+
+
+def parseArugments():
+
+    parser = argparse.ArgumentParser(description='visReader')
+
+    parser.add_argument(
+        '-i',
+        action='store',
+        dest='visFile',
+        help='vis file, binary or json',
+        required=True)
+
+    parser.add_argument(
+        '-n',
+        action='store',
+        type=int,
+        dest='iteration',
+        help='print the states of this iteration (default -1, none)',
+        default=-1)
+
+    return parser
+
+
+def padded(size):
+    return (size + 3) // 4 * 4
+
+
+def isBinaryVis(visFile):
+    with open(visFile, 'rb') as f:
+        return f.read(4) == visMagic
+
+
+def stringOffsets(stateBytes):
+    # state i is stateBytes[offsets[i]:offsets[i + 1] - 1], every state
+    # ends with a '\0'
+    ends = np.flatnonzero(stateBytes == 0) + 1
+    return np.concatenate([[0], ends]).astype(np.uint32)
+
+
+def readBinaryVis(visFile):
+    data = np.memmap(visFile, dtype=np.uint8, mode='r')
+
+    header = np.frombuffer(data, dtype=headerType, count=1)[0]
+    if header["magic"] != visMagic:
+        raise ValueError(visFile + " is not a binary vis file")
+    if header["version"] != visVersion:
+        raise ValueError(visFile + " has vis format version " +
+                         str(header["version"]) + ", expected " +
+                         str(visVersion))
+
+    vis = {}
+    position = headerType.itemsize
+
+    # every section is a view into the mapped file, nothing is copied
+    def section(dtype, count):
+        nonlocal position
+        values = np.frombuffer(data, dtype=dtype, count=count,
+                               offset=position)
+        position += padded(values.nbytes)
+        return values
+
+    vis["stateBytes"] = section(np.uint8, int(header["stringBytes"]))
+    vis["stateOffsets"] = stringOffsets(vis["stateBytes"])
+
+    for name, countField in zip(visLists, ["numPaths", "numVisited",
+                                           "numCommitted"]):
+        vis[name + "Offsets"] = section("<u4", int(header[countField]) + 1)
+        vis[name + "Varints"] = section(np.uint8,
+                                        int(header[name + "Bytes"]))
+
+    numKeepThinking = int(header["numKeepThinking"])
+    vis["keepThinking"] = np.unpackbits(
+        section(np.uint8, (numKeepThinking + 7) // 8),
+        count=numKeepThinking, bitorder="little").astype(bool)
+
+    return vis
+
+
+def encodeVarints(deltas):
+    # zigzag mapped deltas, 7 bits per byte, the high bit set on all but the
+    # last byte of a value
+    deltas = np.asarray(deltas, dtype=np.int64)
+    values = ((deltas << 1) ^ (deltas >> 63)).astype(np.uint64)
+
+    lengths = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        lengths += rest > 0
+        rest >>= np.uint64(7)
+
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    encoded = np.zeros(int(lengths.sum()), dtype=np.uint8)
+    for k in range(int(lengths.max(initial=0))):
+        has = lengths > k
+        byte = (values[has] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        more = np.where(lengths[has] > k + 1, 0x80, 0)
+        encoded[starts[has] + k] = byte.astype(np.uint8) | more
+    return encoded
+
+
+def decodeVarints(encoded):
+    # the deltas of a run of whole varints
+    encoded = np.asarray(encoded, dtype=np.uint8)
+    if not len(encoded):
+        return np.zeros(0, dtype=np.int64)
+
+    last = encoded < 0x80
+    value = np.concatenate([[0], np.cumsum(last)[:-1]])
+    firstByte = np.concatenate([[0], np.flatnonzero(last)[:-1] + 1])
+    shift = 7 * (np.arange(len(encoded)) - firstByte[value])
+
+    parts = (encoded & 0x7f).astype(np.uint64) << shift.astype(np.uint64)
+    values = np.zeros(int(last.sum()), dtype=np.uint64)
+    np.bitwise_or.at(values, value, parts)
+
+    return (values >> np.uint64(1)).astype(np.int64) ^ \
+        -(values & np.uint64(1)).astype(np.int64)
+
+
+def internIterations(iterations, stateIds, states):
+    offsets = np.zeros(len(iterations) + 1, dtype=np.uint32)
+    encoded = []
+    size = 0
+
+    for i, iteration in enumerate(iterations):
+        ids = []
+        for state in iteration:
+            stateId = stateIds.setdefault(state, len(states))
+            if stateId == len(states):
+                states.append(state)
+            ids.append(stateId)
+
+        varints = encodeVarints(np.diff(ids, prepend=0))
+        encoded.append(varints)
+        size += len(varints)
+        offsets[i + 1] = size
+
+    return offsets, np.concatenate(encoded) if encoded \
+        else np.zeros(0, dtype=np.uint8)
+
+
+def readJsonVis(visFile):
+    with open(visFile) as f:
+        record = json.load(f)
+
+    stateIds = {}
+    states = []
+
+    vis = {}
+    for name in visLists:
+        vis[name + "Offsets"], vis[name + "Varints"] = internIterations(
+            record[name], stateIds, states)
+
+    vis["stateBytes"] = np.frombuffer(
+        b"".join(state.encode("utf-8") + b"\0" for state in states),
+        dtype=np.uint8)
+    vis["stateOffsets"] = stringOffsets(vis["stateBytes"])
+    vis["keepThinking"] = np.array(record["isKeepThinking"], dtype=bool)
+
+    return vis
+
+
+def readVis(visFile):
+    '''
+    returns a dict of numpy arrays:
+    stateOffsets, stateBytes: the string table of the states, state i is
+    stateBytes[stateOffsets[i]:stateOffsets[i + 1] - 1],
+    <list>Offsets, <list>Varints for list in path, visited, committed:
+    iteration i holds the varint, zigzag and delta encoded state ids
+    <list>Varints[<list>Offsets[i]:<list>Offsets[i + 1]],
+    keepThinking: one flag per path entry
+    '''
+    if isBinaryVis(visFile):
+        return readBinaryVis(visFile)
+
+    return readJsonVis(visFile)
+
+
+def numberOfStates(vis):
+    return len(vis["stateOffsets"]) - 1
+
+
+def numberOfIterations(vis, name):
+    return len(vis[name + "Offsets"]) - 1
+
+
+def numberOfIds(vis, name):
+    return int((vis[name + "Varints"] < 0x80).sum())
+
+
+def iterationIds(vis, name, iteration):
+    # state ids of one iteration, only that iteration is decoded
+    offsets = vis[name + "Offsets"]
+    varints = vis[name + "Varints"][offsets[iteration]:offsets[iteration + 1]]
+
+    return np.cumsum(decodeVarints(varints), dtype=np.int64)
+
+
+def decodeIds(vis, name):
+    # state ids of all iterations at once, and the offsets of the
+    # iterations into them: iteration i is ids[idOffsets[i]:idOffsets[i + 1]]
+    varints = vis[name + "Varints"]
+    ids = np.cumsum(decodeVarints(varints), dtype=np.int64)
+
+    # ids ended before every iteration's first byte
+    ended = np.concatenate([[0], np.cumsum(varints < 0x80)])
+    idOffsets = ended[vis[name + "Offsets"].astype(np.int64)]
+
+    # the running sum restarts at every iteration
+    counts = np.diff(idOffsets)
+    starts = idOffsets[:-1]
+    before = np.where(starts > 0, ids[np.maximum(starts - 1, 0)], 0) \
+        if len(ids) else np.zeros(len(starts), dtype=np.int64)
+
+    return ids - np.repeat(before, counts), idOffsets
+
+
+def stateNames(vis, ids):
+    offsets = vis["stateOffsets"]
+    stateBytes = vis["stateBytes"]
+
+    return [stateBytes[offsets[i]:offsets[i + 1] - 1].tobytes()
+            .decode("utf-8") for i in ids]
+
+
+def main():
+    parser = parseArugments()
+    args = parser.parse_args()
+
+    vis = readVis(args.visFile)
+
+    print("states:", numberOfStates(vis))
+    for name in visLists:
+        print(name, "iterations:", numberOfIterations(vis, name),
+              "ids:", numberOfIds(vis, name))
+    print("keep thinking:", int(vis["keepThinking"].sum()), "of",
+          len(vis["keepThinking"]))
+
+    if args.iteration >= 0:
+        for name in visLists:
+            if args.iteration < numberOfIterations(vis, name):
+                print(name, stateNames(vis, iterationIds(vis, name,
+                                                         args.iteration)))
+
+
+if __name__ == '__main__':
+    main()
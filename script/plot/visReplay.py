@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+'''
+python3 script
+replay the search of a realtimeSolver run (-v visOut) on its
+gridPathfinding or racetrack map
+
+frame i shows the states visited and committed in search iteration i and
+the agent path up to it. frames are built on demand from the memory mapped
+vis file (see visReader.py), so only the shown iterations are decoded, and
+drawn by updating one numpy raster instead of a patch per cell.
+
+eg:
+python visReplay.py -v vis.bin -m 1.gp
+python visReplay.py -v vis.bin -m barto-bigger.track -o replay.mp4
+python visReplay.py -v vis.bin -m 1.gp -o frames/ -s 100 -e 200
+'''
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+import visReader
+
+# imported in main, after the backend is chosen
+plt = None
+
+# rgb of every cell kind
+colors = {
+    "free": (255, 255, 255),
+    "blocked": (40, 40, 40),
+    "goal": (0, 170, 0),
+    "start": (250, 200, 0),
+    "trail": (120, 160, 255),
+    "visited": (255, 190, 190),
+    "committed": (220, 40, 40),
+    "agent": (0, 0, 160),
+}
+
+
+def parseArugments():
+
+    parser = argparse.ArgumentParser(description='visReplay')
+
+    parser.add_argument(
+        '-v',
+        action='store',
+        dest='visFile',
+        help='vis file of the run, binary or json',
+        required=True)
+
+    parser.add_argument(
+        '-m',
+        action='store',
+        dest='mapFile',
+        help='map of the run: gridPathfinding instance (.gp) or \
+              racetrack map (.track)',
+        required=True)
+
+    parser.add_argument(
+        '-o',
+        action='store',
+        dest='outFile',
+        help='export instead of showing: a video file (eg: replay.mp4, \
+              needs ffmpeg) or a directory for a png per frame \
+              (default NA, interactive)',
+        default='NA')
+
+    parser.add_argument(
+        '-s',
+        action='store',
+        type=int,
+        dest='start',
+        help='first iteration (default 0)',
+        default=0)
+
+    parser.add_argument(
+        '-e',
+        action='store',
+        type=int,
+        dest='end',
+        help='last iteration, exclusive (default -1, the last one)',
+        default=-1)
+
+    parser.add_argument(
+        '-st',
+        action='store',
+        type=int,
+        dest='step',
+        help='export every step-th iteration (default 1)',
+        default=1)
+
+    parser.add_argument(
+        '-fps',
+        action='store',
+        type=int,
+        dest='fps',
+        help='frames per second of the video (default 10)',
+        default=10)
+
+    parser.add_argument(
+        '-px',
+        action='store',
+        type=int,
+        dest='cellPixels',
+        help='pixels per map cell of the png frames (default 8)',
+        default=8)
+
+    parser.add_argument(
+        '-bk',
+        action='store',
+        dest='backend',
+        help='matplotlib backend (default NA, matplotlib default when \
+              interactive, Agg when exporting)',
+        default='NA')
+
+    return parser
+
+
+def readMap(mapFile):
+    # width line, height line, then one row of cells per line, cells may
+    # be separated by spaces
+    with open(mapFile) as f:
+        width = int(f.readline().split()[0])
+        height = int(f.readline().split()[0])
+        rows = ["".join(f.readline().split())[:width] for _ in range(height)]
+
+    cells = np.array([list(row.ljust(width, '_')) for row in rows])
+
+    return cells
+
+
+def baseRaster(cells):
+    raster = np.empty(cells.shape + (3,), dtype=np.uint8)
+    raster[:] = colors["free"]
+    raster[cells == '#'] = colors["blocked"]
+    raster[cells == '*'] = colors["goal"]
+    raster[cells == '@'] = colors["start"]
+
+    return raster
+
+
+def stateLocations(vis):
+    # x, y of every state of the string table: the states are "x y" for
+    # gridPathfinding and "x y dx dy" for racetrack
+    numStates = visReader.numberOfStates(vis)
+    if numStates == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    # the terminators become separators, then split all at once
+    stateBytes = vis["stateBytes"]
+    text = np.where(stateBytes == 0, ord(' '), stateBytes).astype(
+        np.uint8).tobytes()
+    tokens = np.array(text.split(), dtype=np.int64)
+
+    return tokens.reshape(numStates, -1)[:, :2]
+
+
+class Replay:
+    def __init__(self, vis, cells):
+        self.vis = vis
+        self.base = baseRaster(cells)
+        self.locations = stateLocations(vis)
+        self.raster = self.base.copy()
+
+        # the path is one state per action, small enough to decode whole
+        self.pathIds, self.pathIdOffsets = visReader.decodeIds(vis, "path")
+        self.numFrames = max(visReader.numberOfIterations(vis, name)
+                             for name in visReader.visLists)
+
+    def paint(self, ids, color):
+        if len(ids):
+            cells = self.locations[ids]
+            self.raster[cells[:, 1], cells[:, 0]] = color
+
+    def iterationIds(self, name, frame):
+        if frame >= visReader.numberOfIterations(self.vis, name):
+            return np.zeros(0, dtype=np.int64)
+        return visReader.iterationIds(self.vis, name, frame)
+
+    def frame(self, frame):
+        # one raster reused for every frame, the caller copies it if kept
+        np.copyto(self.raster, self.base)
+
+        # every state the path iterations up to this frame went through, a
+        # path iteration holds one state per action it committed to
+        iterations = min(frame + 1,
+                         visReader.numberOfIterations(self.vis, "path"))
+        trail = self.pathIds[:int(self.pathIdOffsets[iterations])]
+        self.paint(trail, colors["trail"])
+        self.paint(self.iterationIds("visited", frame), colors["visited"])
+        self.paint(self.iterationIds("committed", frame), colors["committed"])
+        self.paint(trail[-1:], colors["agent"])
+
+        return self.raster
+
+    def title(self, frame):
+        keepThinking = self.vis["keepThinking"]
+        title = "iteration " + str(frame) + "/" + str(self.numFrames - 1)
+        if frame < len(keepThinking) and keepThinking[frame]:
+            title += " (keep thinking)"
+        return title
+
+
+def frameRange(replay, args):
+    end = replay.numFrames if args.end < 0 else min(args.end,
+                                                    replay.numFrames)
+    return range(max(args.start, 0), end, max(args.step, 1))
+
+
+def exportImages(replay, frames, outDir, cellPixels):
+    os.makedirs(outDir, exist_ok=True)
+
+    for frame in frames:
+        raster = replay.frame(frame)
+        image = raster.repeat(cellPixels, axis=0).repeat(cellPixels, axis=1)
+        plt.imsave(os.path.join(outDir, "frame-%06d.png" % frame), image)
+
+    print("wrote", len(frames), "frames to", outDir)
+
+
+def exportVideo(replay, frames, outFile, fps):
+    from matplotlib import animation
+
+    if not animation.writers.is_available("ffmpeg"):
+        print("ffmpeg not found, export png frames to a directory instead")
+        sys.exit(1)
+
+    fig, ax = plt.subplots()
+    ax.axis('off')
+    image = ax.imshow(replay.frame(frames[0]), interpolation='nearest')
+
+    writer = animation.FFMpegWriter(fps=fps)
+    with writer.saving(fig, outFile, dpi=150):
+        for frame in frames:
+            image.set_data(replay.frame(frame))
+            ax.set_title(replay.title(frame))
+            writer.grab_frame()
+
+    plt.close(fig)
+    print("wrote", len(frames), "frames to", outFile)
+
+
+def showInteractive(replay, frames):
+    from matplotlib.widgets import Slider
+
+    fig, ax = plt.subplots()
+    fig.subplots_adjust(bottom=0.15)
+    ax.axis('off')
+    image = ax.imshow(replay.frame(frames[0]), interpolation='nearest')
+    ax.set_title(replay.title(frames[0]))
+
+    sliderAx = fig.add_axes([0.15, 0.04, 0.7, 0.03])
+    slider = Slider(sliderAx, "iteration", frames[0], frames[-1],
+                    valinit=frames[0], valstep=frames.step)
+
+    # scrubbing decodes only the iteration the slider lands on
+    def update(value):
+        frame = int(value)
+        image.set_data(replay.frame(frame))
+        ax.set_title(replay.title(frame))
+        fig.canvas.draw_idle()
+
+    def keyPress(event):
+        if event.key == "right":
+            slider.set_val(min(slider.val + frames.step, frames[-1]))
+        elif event.key == "left":
+            slider.set_val(max(slider.val - frames.step, frames[0]))
+
+    slider.on_changed(update)
+    fig.canvas.mpl_connect("key_press_event", keyPress)
+
+    plt.show()
+
+
+def main():
+    global plt
+
+    parser = parseArugments()
+    args = parser.parse_args()
+    print(args)
+
+    import matplotlib
+    if args.backend != 'NA':
+        matplotlib.use(args.backend)
+    elif args.outFile != 'NA':
+        matplotlib.use('Agg')
+    import matplotlib.pyplot
+    plt = matplotlib.pyplot
+
+    replay = Replay(visReader.readVis(args.visFile), readMap(args.mapFile))
+
+    frames = frameRange(replay, args)
+    if not len(frames):
+        print("no iteration in range, the run has", replay.numFrames)
+        return
+
+    if args.outFile == 'NA':
+        showInteractive(replay, frames)
+    elif os.path.splitext(args.outFile)[1]:
+        exportVideo(replay, frames, args.outFile, args.fps)
+    else:
+        exportImages(replay, frames, args.outFile, args.cellPixels)
+
+
+if __name__ == '__main__':
+    main()
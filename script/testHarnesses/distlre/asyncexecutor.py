@@ -0,0 +1,226 @@
+import asyncio
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty
+from subprocess import PIPE
+from threading import Thread
+import psutil
+
+from distlre.localexecutor import get_task_memory_limit, \
+    get_command_prefix, get_memory_used, is_out_of_address_space, \
+    MEMORY_MODES, set_spill_files
+from distlre.outputbuffer import DEFAULT_MAX_OUTPUT_BYTES, READ_SIZE, \
+    make_output_buffers
+
+# seconds the task and its output readers get to finish once it is killed
+# or exited; a grandchild that inherited the pipes and left the task's
+# process group can keep them open for good
+GRACE_PERIOD = 1.0
+
+
+class AsyncExecutor:
+    def __init__(self, task_queue, thread_count, memory_mode='server',
+                 memory_check_interval=1.0,
+                 max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES, spill_dir=None):
+        if memory_mode not in MEMORY_MODES:
+            raise ValueError('unknown memory mode: ' + memory_mode)
+        self.task_queue = task_queue
+        self.thread_count = thread_count
+        self.memory_mode = memory_mode
+        self.memory_check_interval = memory_check_interval
+        self.max_output_bytes = max_output_bytes
+        self.spill_dir = spill_dir
+        self.running = {}
+        self.queue_reader = None
+        self.loop_thread = None
+
+    def start(self):
+        self.loop_thread = Thread(target=asyncio.run, args=(self.run(),))
+        self.loop_thread.start()
+
+    def wait(self):
+        self.loop_thread.join()
+
+    async def run(self):
+        # waiting for the next task blocks, keep it off the event loop
+        self.queue_reader = ThreadPoolExecutor(self.thread_count)
+
+        monitor = None
+        if self.memory_mode != 'rlimit':
+            monitor = asyncio.ensure_future(self.monitor_memory())
+
+        await asyncio.gather(*[self.work() for _ in range(self.thread_count)])
+
+        if monitor is not None:
+            monitor.cancel()
+
+        self.queue_reader.shutdown()
+
+    async def work(self):
+        while True:
+            try:
+                internal_task = await asyncio.get_running_loop().run_in_executor(
+                    self.queue_reader, self.task_queue.get)
+            except Empty:
+                break
+
+            await self.execute_task(internal_task)
+
+    async def execute_task(self, internal_task):
+        internal_task.future.set_running_or_notify_cancel()
+        task_memory_limit = get_task_memory_limit(internal_task.task)
+
+        await self.run_task(internal_task, internal_task.task,
+                            task_memory_limit)
+
+    async def run_task(self, internal_task, task, task_memory_limit):
+        transports = []
+        try:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+
+            command = get_command_prefix(self.memory_mode,
+                                         task_memory_limit) + task.command
+
+            # output pipes of our own rather than PIPE: their transports
+            # are ours to close, even while a child that left the task's
+            # process group still holds the other end
+            stdout_reader, stdout_fd = await open_pipe(loop, transports)
+            stderr_reader, stderr_fd = await open_pipe(loop, transports)
+
+            # its own process group, so a kill reaches the children the
+            # task started as well
+            try:
+                process = await asyncio.create_subprocess_shell(
+                    command, stdin=PIPE, stdout=stdout_fd, stderr=stderr_fd,
+                    start_new_session=True)
+            finally:
+                os.close(stdout_fd)
+                os.close(stderr_fd)
+
+            self.running[process] = (task, task_memory_limit)
+
+            # drained chunk by chunk into bounded buffers while it runs
+            stdout, stderr = make_output_buffers(self.max_output_bytes,
+                                                 self.spill_dir)
+            readers = asyncio.gather(read_stream(stdout_reader, stdout),
+                                     read_stream(stderr_reader, stderr))
+
+            # the input is written alongside the wait, so a task that
+            # does not read it is still held to its time limit
+            writer = asyncio.ensure_future(write_input(process.stdin,
+                                                       task.input))
+
+            try:
+                await asyncio.wait_for(process.wait(), task.time_limit)
+            except asyncio.TimeoutError:
+                if process.returncode is None:
+                    task.output = "OutOfTime exceeded time_limit: " + \
+                        str(task.time_limit)
+                kill_process_group(process)
+                await wait_or_cancel(process.wait())
+            finally:
+                writer.cancel()
+                await asyncio.gather(writer, return_exceptions=True)
+                del self.running[process]
+                task.runtime = loop.time() - start
+
+            # children the task left running are stopped with it; the
+            # output read so far is kept if the readers are cancelled
+            kill_process_group(process)
+            await wait_or_cancel(readers)
+            stdout.close()
+            stderr.close()
+            set_spill_files(task, stdout, stderr)
+
+            if process.returncode == 0:
+                task.output = stdout.getvalue()
+
+            task.error = stderr.getvalue()
+
+            if self.memory_mode == 'rlimit' and \
+                    is_out_of_address_space(process.returncode, task.error):
+                task.output = "OutOfMemory exceeded max_bytes: " + \
+                    str(task_memory_limit)
+
+            internal_task.future.set_result(task)
+        except Exception as e:
+            internal_task.future.set_exception(e)
+        finally:
+            # closed here, not when the event loop is already gone
+            for transport in transports:
+                transport.close()
+
+    async def monitor_memory(self):
+        while True:
+            await asyncio.sleep(self.memory_check_interval)
+
+            if not self.running:
+                continue
+
+            # the server wide reading is shared by every running task
+            server_mem_used = None
+            if self.memory_mode == 'server':
+                server_mem_used = psutil.virtual_memory().used
+
+            for process, (task, task_memory_limit) in list(
+                    self.running.items()):
+                mem_used = server_mem_used
+                if mem_used is None:
+                    mem_used = get_memory_used(self.memory_mode, process.pid)
+
+                if mem_used >= task_memory_limit and \
+                        process.returncode is None:
+                    task.output = "OutOfMemory exceeded max_bytes: " + \
+                        str(mem_used)
+                    kill_process_group(process)
+
+
+def kill_process_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+async def wait_or_cancel(awaitable):
+    try:
+        await asyncio.wait_for(awaitable, GRACE_PERIOD)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def open_pipe(loop, transports):
+    # a pipe read through a stream reader; the transport is added to
+    # transports, the write end is for the task and closed by the caller
+    read_fd, write_fd = os.pipe()
+    reader = asyncio.StreamReader()
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader),
+        os.fdopen(read_fd, 'rb', buffering=0))
+    transports.append(transport)
+    return reader, write_fd
+
+
+async def write_input(stdin, data):
+    # a task that exits without reading its input is not an error
+    try:
+        if data is not None:
+            stdin.write(data)
+            await stdin.drain()
+        stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    except asyncio.CancelledError:
+        # the input the task did not read is dropped
+        stdin.transport.abort()
+        raise
+
+
+async def read_stream(stream, buffer):
+    while True:
+        chunk = await stream.read(READ_SIZE)
+        if not chunk:
+            break
+        buffer.write(chunk)
@@ -1,7 +1,9 @@
 from concurrent.futures import Future
-from queue import Queue
 from multiprocessing import Lock
 
+from distlre.outputbuffer import DEFAULT_MAX_OUTPUT_BYTES
+from distlre.scheduler import TaskQueue
+
 
 class Task:
     def __init__(self, command, meta, time_limit, memory_limit):
@@ -10,6 +12,10 @@ class Task:
         self.input = None
         self.output = None
         self.error = None
+        # full stdout/stderr when the executor spills them to disk
+        self.output_file = None
+        self.error_file = None
+        self.runtime = None
         self.time_limit = time_limit
         self.memory_limit = memory_limit
 
@@ -21,34 +27,53 @@ class InternalTask:
 
 
 class RemoteHost:
-    def __init__(self, hostname, port=22, username=None, password=None, key_file_path=None):
+    def __init__(self, hostname, port=22, username=None, password=None, key_file_path=None,
+                 slots=1):
         self.hostname = hostname
         self.port = port
         self.username = username
         self.password = password
         self.key_file_path = key_file_path
+        self.slots = slots
 
 
 class DistLRE:
-    def __init__(self, local_threads=0, remote_hosts=None):
+    def __init__(self, local_threads=0, remote_hosts=None, local_mode='thread',
+                 memory_mode='server', runtime_history=None,
+                 max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES, spill_dir=None):
         if remote_hosts is None:
             remote_hosts = []
         self.local_threads = local_threads
         self.remote_hosts = remote_hosts
-        self.task_queue = Queue()
+        # local and remote workers pull from the same queue, longest
+        # expected task first, so whoever is free takes the next one
+        self.task_queue = TaskQueue(runtime_history)
+        self.runtime_history = self.task_queue.runtime_history
         self.local_executor = None
         self.remote_executor = None
 
         if local_threads != 0:
-            from distlre.localexecutor import LocalExecutor
-            self.local_executor = LocalExecutor(self.task_queue, local_threads)
+            if local_mode == 'async':
+                from distlre.asyncexecutor import AsyncExecutor
+                self.local_executor = AsyncExecutor(
+                    self.task_queue, local_threads, memory_mode,
+                    max_output_bytes=max_output_bytes, spill_dir=spill_dir)
+            else:
+                from distlre.localexecutor import LocalExecutor
+                self.local_executor = LocalExecutor(
+                    self.task_queue, local_threads, memory_mode,
+                    max_output_bytes, spill_dir)
 
         if remote_hosts:
             from distlre.remoteexecutor import RemoteExecutor
-            self.remote_executor = RemoteExecutor(self.task_queue, remote_hosts)
+            self.remote_executor = RemoteExecutor(
+                self.task_queue, remote_hosts,
+                max_output_bytes=max_output_bytes, spill_dir=spill_dir)
 
     def submit(self, task):
         internal_task = InternalTask(task)
+        internal_task.future.add_done_callback(
+            lambda _: self.runtime_history.record(task))
 
         self.task_queue.put(internal_task)
 
@@ -62,8 +87,13 @@ class DistLRE:
             self.remote_executor.start()
 
     def wait(self):
+        # tasks can be submitted until wait, workers stay alive until then
+        self.task_queue.close()
+
         if self.local_executor is not None:
             self.local_executor.wait()
 
         if self.remote_executor is not None:
             self.remote_executor.wait()
+
+        self.runtime_history.save()
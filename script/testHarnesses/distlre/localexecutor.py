@@ -1,20 +1,39 @@
 from queue import Empty
 from subprocess import Popen, PIPE
 from threading import Thread
+import os
+import selectors
 import time
 import psutil
 import re
 
+from distlre.outputbuffer import DEFAULT_MAX_OUTPUT_BYTES, READ_SIZE, \
+    make_output_buffers
+
+# server: kill when the whole server uses more than the task limit
+# rss: kill when the task's own resident set exceeds the task limit
+# rlimit: cap the task's address space (RLIMIT_AS), no sampling
+MEMORY_MODES = ('server', 'rss', 'rlimit')
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
 
 class LocalExecutor:
-    def __init__(self, task_queue, thread_count):
+    def __init__(self, task_queue, thread_count, memory_mode='server',
+                 max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES, spill_dir=None):
+        if memory_mode not in MEMORY_MODES:
+            raise ValueError('unknown memory mode: ' + memory_mode)
         self.task_queue = task_queue
         self.thread_count = thread_count
+        self.memory_mode = memory_mode
+        self.max_output_bytes = max_output_bytes
+        self.spill_dir = spill_dir
         self.workers = None
         self.initialize_workers()
 
     def initialize_workers(self):
-        self.workers = [LocalWorker(self.task_queue)
+        self.workers = [LocalWorker(self.task_queue, self.memory_mode,
+                                    self.max_output_bytes, self.spill_dir)
                         for _ in range(self.thread_count)]
 
     def start(self):
@@ -27,28 +46,40 @@ class LocalExecutor:
 
 
 class LocalWorker(Thread):
-    def __init__(self, task_queue):
+    def __init__(self, task_queue, memory_mode='server',
+                 max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES, spill_dir=None):
         super(LocalWorker, self).__init__()
         self.task_queue = task_queue
+        self.memory_mode = memory_mode
+        self.max_output_bytes = max_output_bytes
+        self.spill_dir = spill_dir
 
     def run(self):
         while True:
             try:
-                internal_task = self.task_queue.get(block=False)
-                execute_task(internal_task)
+                internal_task = self.task_queue.get()
+                execute_task(internal_task, self.memory_mode,
+                             self.max_output_bytes, self.spill_dir)
             except Empty:
                 break
 
 
-def execute_task(internal_task):
-    task = internal_task.task
-    internal_task.future.set_running_or_notify_cancel()
+def get_task_memory_limit(task):
     task_memory_limit = 7 * 1024 * 1024 * 1024  # 7 GB
 
     if task.memory_limit is not None:
-        task_memory_limit = task.memory_limit * 1024 * 1024 * 1024
+        task_memory_limit = int(task.memory_limit * 1024 * 1024 * 1024)
+
+    return task_memory_limit
 
-    run_task(internal_task, internal_task.task, task_memory_limit)
+
+def execute_task(internal_task, memory_mode='server',
+                 max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES, spill_dir=None):
+    internal_task.future.set_running_or_notify_cancel()
+    task_memory_limit = get_task_memory_limit(internal_task.task)
+
+    run_task(internal_task, internal_task.task, task_memory_limit,
+             memory_mode, max_output_bytes, spill_dir)
 
 
 def get_mem_use(pid):
@@ -68,21 +99,123 @@ def get_mem_use(pid):
         return uss
 
 
-def run_task(internal_task, task, task_memory_limit):
+def get_rss(pid):
+    # resident set size from statm, a single short read unlike smaps
+    with open("/proc/%d/statm" % pid, "rb") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+
+def get_memory_used(memory_mode, pid):
+    if memory_mode == 'rss':
+        try:
+            return get_rss(pid)
+        except (FileNotFoundError, ProcessLookupError):
+            # the process exited between poll and read
+            return 0
+
+    # kill based on total server mem use
+    return psutil.virtual_memory().used
+
+
+def get_command_prefix(memory_mode, task_memory_limit):
+    # ulimit in the shell rather than setrlimit in a preexec_fn, which is
+    # not safe with the worker threads; exec keeps the pid of the task
+    if memory_mode == 'rlimit':
+        return "ulimit -v %d; exec " % (task_memory_limit // 1024)
+
+    return "exec "
+
+
+def is_out_of_address_space(returncode, error):
+    return returncode != 0 and error is not None and \
+        (b'bad_alloc' in error or b'MemoryError' in error)
+
+
+class InputWriter:
+    # the task input, written to a non blocking stdin a chunk at a time
+    # as the task reads it; stdin is closed once all of it is written
+    def __init__(self, stdin, data):
+        self.stdin = stdin
+        self.data = memoryview(data)
+        os.set_blocking(stdin.fileno(), False)
+
+    def write(self, selector):
+        try:
+            written = os.write(self.stdin.fileno(), self.data[:READ_SIZE])
+            self.data = self.data[written:]
+        except BlockingIOError:
+            return
+        except (BrokenPipeError, ConnectionResetError):
+            # a task that exits without reading its input is not an error
+            self.data = self.data[:0]
+
+        if not self.data:
+            self.close(selector)
+
+    def close(self, selector):
+        if not self.stdin.closed:
+            selector.unregister(self.stdin)
+            self.stdin.close()
+
+
+def drain_streams(selector, timeout):
+    # reads whatever is ready and writes input the task is waiting on, a
+    # stream is unregistered at eof
+    events = selector.select(timeout)
+
+    for key, mask in events:
+        if mask & selectors.EVENT_WRITE:
+            key.data.write(selector)
+            continue
+
+        chunk = os.read(key.fd, READ_SIZE)
+        if chunk:
+            key.data.write(chunk)
+        else:
+            selector.unregister(key.fileobj)
+
+    return events
+
+
+def set_spill_files(task, stdout, stderr):
+    task.output_file = stdout.spill_file
+    task.error_file = stderr.spill_file
+
+
+def run_task(internal_task, task, task_memory_limit, memory_mode='server',
+             max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES, spill_dir=None):
     try:
         start = time.time()
 
-        process = Popen("exec " + task.command, stdin=PIPE,
+        command = get_command_prefix(memory_mode, task_memory_limit) + \
+            task.command
+
+        process = Popen(command, stdin=PIPE,
                         stdout=PIPE, stderr=PIPE, shell=True)
 
         pid = process.pid
 
-        if task.input is not None:
-            process.stdin.write(task.input)
+        # both pipes are drained while the task runs and the input is fed
+        # in the same loop, so a chatty solver never blocks on a full pipe
+        # and the limits are checked while it reads; only a bounded tail
+        # of the output is kept
+        stdout, stderr = make_output_buffers(max_output_bytes, spill_dir)
+        selector = selectors.DefaultSelector()
+        selector.register(process.stdout, selectors.EVENT_READ, stdout)
+        selector.register(process.stderr, selectors.EVENT_READ, stderr)
+
+        input_writer = None
+        if task.input:
+            input_writer = InputWriter(process.stdin, task.input)
+            selector.register(process.stdin, selectors.EVENT_WRITE,
+                              input_writer)
+        else:
+            process.stdin.close()
 
         while process.poll() is None:
-            mem_used = psutil.virtual_memory().used # kill based on total server mem use
-            # mem_used = get_mem_use(pid) # kill based on process mem use. Slow caused by repetive smaps reads.
+            mem_used = 0
+            if memory_mode != 'rlimit':
+                mem_used = get_memory_used(memory_mode, pid)
             if mem_used >= task_memory_limit:
                 internal_task.task.output = "OutOfMemory exceeded max_bytes: " + \
                     str(mem_used)
@@ -94,20 +227,37 @@ def run_task(internal_task, task, task_memory_limit):
                 process.terminate()
                 process.kill()
 
-            time.sleep(0.05)
+            drain_streams(selector, 0.05)
 
         process.wait()
 
-        if process.returncode == 0:
-            task.output = b''.join(
-                process.stdout.readlines())  # .decode('utf-8')
+        # input the task did not read before it exited is dropped
+        if input_writer is not None:
+            input_writer.close(selector)
 
-        task.error = b''.join(process.stderr.readlines())  # .decode('utf-8')
+        # the rest up to eof; a silent pipe still held open by a
+        # leftover child is given up on
+        while selector.get_map() and drain_streams(selector, 1.0):
+            pass
 
-        internal_task.future.set_result(task)
-
-        process.stdin.close()
+        selector.close()
         process.stdout.close()
         process.stderr.close()
+        stdout.close()
+        stderr.close()
+        set_spill_files(task, stdout, stderr)
+
+        if process.returncode == 0:
+            task.output = stdout.getvalue()
+
+        task.error = stderr.getvalue()
+        task.runtime = time.time() - start
+
+        if memory_mode == 'rlimit' and \
+                is_out_of_address_space(process.returncode, task.error):
+            task.output = "OutOfMemory exceeded max_bytes: " + \
+                str(task_memory_limit)
+
+        internal_task.future.set_result(task)
     except Exception as e:
         internal_task.future.set_exception(e)
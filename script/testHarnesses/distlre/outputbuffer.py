@@ -0,0 +1,65 @@
+from collections import deque
+import os
+import tempfile
+
+# the solver prints its result record last, so the tail is what is kept
+DEFAULT_MAX_OUTPUT_BYTES = 16 * 1024 * 1024
+
+READ_SIZE = 64 * 1024
+
+
+class OutputBuffer:
+    def __init__(self, max_bytes=DEFAULT_MAX_OUTPUT_BYTES, spill_file=None):
+        self.max_bytes = max_bytes
+        self.chunks = deque()
+        self.size = 0
+        self.dropped = 0
+        self.spill_file = spill_file
+        self.spill = None
+
+        if spill_file is not None:
+            self.spill = open(spill_file, 'wb')
+
+    def write(self, chunk):
+        # the spill file gets everything, memory only the last max_bytes
+        if self.spill is not None:
+            self.spill.write(chunk)
+
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+
+        excess = self.size - self.max_bytes
+        while excess > 0:
+            head = self.chunks[0]
+            if len(head) <= excess:
+                self.chunks.popleft()
+                trimmed = len(head)
+            else:
+                self.chunks[0] = head[excess:]
+                trimmed = excess
+
+            self.size -= trimmed
+            self.dropped += trimmed
+            excess -= trimmed
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+
+def make_output_buffers(max_bytes=DEFAULT_MAX_OUTPUT_BYTES, spill_dir=None):
+    if spill_dir is None:
+        return OutputBuffer(max_bytes), OutputBuffer(max_bytes)
+
+    buffers = []
+    for suffix in ('.stdout', '.stderr'):
+        fd, spill_file = tempfile.mkstemp(prefix='task-', suffix=suffix,
+                                          dir=spill_dir)
+        os.close(fd)
+        buffers.append(OutputBuffer(max_bytes, spill_file))
+
+    return buffers[0], buffers[1]
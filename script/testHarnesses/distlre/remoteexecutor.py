@@ -1,21 +1,45 @@
 from queue import Empty
-from threading import Thread
+from threading import Thread, Lock
 
 from os import path
+import select
+import shlex
+import socket
+import time
 import paramiko
-from resource import setrlimit, RLIMIT_AS, getrlimit
+
+from distlre.localexecutor import get_task_memory_limit, set_spill_files
+from distlre.outputbuffer import DEFAULT_MAX_OUTPUT_BYTES, \
+    make_output_buffers
+
+CHANNEL_READ_SIZE = 64 * 1024
+
+# exit status of timeout(1) when it stopped the command, with SIGTERM or,
+# if that was ignored, with SIGKILL
+REMOTE_TIMEOUT_STATUSES = (124, 128 + 9)
+# seconds the remote timeout gets to stop the task before the channel is
+# given up on locally
+REMOTE_TIMEOUT_GRACE = 5
 
 
 class RemoteExecutor:
-    def __init__(self, task_queue, hosts):
+    def __init__(self, task_queue, hosts,
+                 max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES, spill_dir=None):
         self.task_queue = task_queue
         self.hosts = hosts
+        self.max_output_bytes = max_output_bytes
+        self.spill_dir = spill_dir
+        self.connections = None
         self.workers = None
         self.initialize_workers()
 
     def initialize_workers(self):
-        self.workers = [SshWorker(host, self.task_queue)
-                        for host in self.hosts]
+        # one pooled connection per host, shared by all of its slots
+        self.connections = [SshConnection(host) for host in self.hosts]
+        self.workers = [SshWorker(connection, self.task_queue,
+                                  self.max_output_bytes, self.spill_dir)
+                        for connection in self.connections
+                        for _ in range(connection.host.slots)]
 
     def start(self):
         for worker in self.workers:
@@ -25,51 +49,167 @@ class RemoteExecutor:
         for worker in self.workers:
             worker.join()
 
+        for connection in self.connections:
+            connection.close()
+
+
+class SshConnection:
+    def __init__(self, host):
+        self.host = host
+        self.client = None
+        self.lock = Lock()
+
+    def is_active(self):
+        if self.client is None:
+            return False
+
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def open_channel(self):
+        # every task gets its own channel over the shared transport;
+        # a dropped transport is reconnected once before giving up
+        for attempt in range(2):
+            with self.lock:
+                if not self.is_active():
+                    self.reconnect()
+                transport = self.client.get_transport()
+
+            try:
+                return transport.open_session()
+            except (paramiko.SSHException, EOFError, socket.error):
+                if attempt > 0:
+                    raise
+
+                with self.lock:
+                    if self.client.get_transport() is transport:
+                        self.client.close()
+
+    def reconnect(self):
+        if self.client is not None:
+            self.client.close()
+
+        self.client = spawn_ssh_client(self.host)
+
+    def close(self):
+        with self.lock:
+            if self.client is not None:
+                self.client.close()
+                self.client = None
+
 
 class SshWorker(Thread):
-    def __init__(self, host, task_queue):
+    def __init__(self, connection, task_queue,
+                 max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES, spill_dir=None):
         super(SshWorker, self).__init__()
         self.task_queue = task_queue
-        self.host = host
+        self.connection = connection
+        self.max_output_bytes = max_output_bytes
+        self.spill_dir = spill_dir
 
     def run(self):
-        client = spawn_ssh_client(self.host)
         while True:
             try:
-                internal_task = self.task_queue.get(block=False)
+                internal_task = self.task_queue.get()
             except Empty:
                 break
 
-            execute_remote_task(client, internal_task)
+            execute_remote_task(self.connection, internal_task,
+                                self.max_output_bytes, self.spill_dir)
 
 
-def execute_remote_task(client, internal_task):
+def execute_remote_task(connection, internal_task,
+                        max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES,
+                        spill_dir=None):
     task = internal_task.task
     internal_task.future.set_running_or_notify_cancel()
 
-    task_memory_limit = 7 * 1024 * 1024 * 1024  # 7 GB
-    if task.memory_limit is not None:
-        task_memory_limit = task.memory_limit * 1024 * 1024 * 1024
+    task_memory_limit = get_task_memory_limit(task)
 
     try:
-        setrlimit(RLIMIT_AS, (task_memory_limit, task_memory_limit))
+        start = time.time()
 
-        command = task.command
-        stdin, stdout, stderr = client.exec_command(
-            command, timeout=task.time_limit)
+        # the limits have to apply on the remote host, not to this process;
+        # timeout runs the task in its own process group and kills all of
+        # it, so a timed out task does not keep the slot busy after the
+        # channel is closed
+        command = "ulimit -v %d; exec timeout -k 1 %s sh -c %s" % (
+            task_memory_limit // 1024, task.time_limit,
+            shlex.quote(task.command))
 
-        if task.input:
-            stdin.write(task.input)
-            stdin.flush()
+        # the same bounded tail (and spill files) as on a local worker
+        output, error = make_output_buffers(max_output_bytes, spill_dir)
 
-        task.output = ''.join(stdout.readlines())
-        task.error = ''.join(stderr.readlines())
+        try:
+            channel = connection.open_channel()
+
+            # closed whatever happens, a leaked channel counts against the
+            # server's channel limit of the pooled transport
+            try:
+                timed_out = run_channel(channel, command, task, start,
+                                        output, error)
+            finally:
+                channel.close()
+        finally:
+            output.close()
+            error.close()
+
+        task.runtime = time.time() - start
+        set_spill_files(task, output, error)
+
+        task.output = output.getvalue().decode('utf-8', errors='replace')
+        task.error = error.getvalue().decode('utf-8', errors='replace')
+
+        if timed_out:
+            task.output = "OutOfTime exceeded time_limit: " + \
+                str(task.time_limit)
 
         internal_task.future.set_result(task)
     except Exception as e:
         internal_task.future.set_exception(e)
 
 
+def run_channel(channel, command, task, start, output, error):
+    # runs the command on the channel, true if it ran out of time
+    channel.exec_command(command)
+
+    if task.input:
+        channel.sendall(task.input)
+    channel.shutdown_write()
+
+    timed_out = read_channel(
+        channel, task.time_limit + REMOTE_TIMEOUT_GRACE, output, error)
+
+    return timed_out or \
+        (channel.recv_exit_status() in REMOTE_TIMEOUT_STATUSES and
+         time.time() - start >= task.time_limit)
+
+
+def read_channel(channel, time_limit, output, error):
+    # drains the channel into the output and error buffers, true if the
+    # time limit ran out first
+    deadline = time.time() + time_limit
+
+    while True:
+        while channel.recv_ready():
+            output.write(channel.recv(CHANNEL_READ_SIZE))
+        while channel.recv_stderr_ready():
+            error.write(channel.recv_stderr(CHANNEL_READ_SIZE))
+
+        # the exit status can arrive before the last of the output, so
+        # the channel is read up to eof
+        if (channel.eof_received or channel.closed) and \
+                not channel.recv_ready() and not channel.recv_stderr_ready():
+            return False
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return True
+
+        # wakes up on stdout/stderr data or eof
+        select.select([channel], [], [], min(remaining, 1.0))
+
+
 def spawn_ssh_client(host):
     key = None
 
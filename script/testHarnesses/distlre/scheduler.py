@@ -0,0 +1,110 @@
+import heapq
+import itertools
+import json
+from os import path
+from queue import Empty
+from threading import Condition, Lock
+
+RUNTIME_KEY_FIELDS = ('domain', 'subdomain', 'alg', 'lookahead')
+
+
+class RuntimeHistory:
+    def __init__(self, history_file=None):
+        self.history_file = history_file
+        self.runtimes = {}
+        self.lock = Lock()
+
+        if history_file is not None and path.exists(history_file):
+            self.load()
+
+    @staticmethod
+    def key(task):
+        # tasks describe themselves through a meta dict, eg.
+        # {'domain': 'tile', 'subdomain': 'heavy', 'alg': 'dtrts',
+        #  'lookahead': 100, ...}; anything else has no history
+        if not isinstance(task.meta, dict):
+            return None
+
+        values = [task.meta.get(field) for field in RUNTIME_KEY_FIELDS]
+        if all(value is None for value in values):
+            return None
+
+        return '|'.join(str(value) for value in values)
+
+    def expected_runtime(self, task):
+        with self.lock:
+            entry = self.runtimes.get(self.key(task))
+
+        if entry is not None:
+            return entry[1]
+
+        # never seen: assume the worst so it is not left for the tail
+        return task.time_limit
+
+    def record(self, task):
+        key = self.key(task)
+        if key is None or task.runtime is None:
+            return
+
+        with self.lock:
+            count, mean = self.runtimes.get(key, (0, 0.0))
+            count += 1
+            mean += (task.runtime - mean) / count
+            self.runtimes[key] = (count, mean)
+
+    def load(self):
+        with open(self.history_file) as f:
+            self.runtimes = {key: tuple(entry)
+                             for key, entry in json.load(f).items()}
+
+    def save(self):
+        if self.history_file is None:
+            return
+
+        with self.lock:
+            with open(self.history_file, 'w') as f:
+                json.dump(self.runtimes, f)
+
+
+class TaskQueue:
+    def __init__(self, runtime_history=None):
+        if runtime_history is None:
+            runtime_history = RuntimeHistory()
+        self.runtime_history = runtime_history
+        self.heap = []
+        self.counter = itertools.count()
+        self.condition = Condition()
+        self.closed = False
+
+    def put(self, internal_task):
+        # longest expected first, then submission order
+        priority = -self.runtime_history.expected_runtime(internal_task.task)
+
+        with self.condition:
+            heapq.heappush(self.heap,
+                           (priority, next(self.counter), internal_task))
+            self.condition.notify()
+
+    def get(self, block=True, timeout=None):
+        # blocks until a task arrives; Empty once closed and drained
+        with self.condition:
+            if block:
+                self.condition.wait_for(lambda: self.heap or self.closed,
+                                        timeout)
+
+            if not self.heap:
+                raise Empty
+
+            return heapq.heappop(self.heap)[2]
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def qsize(self):
+        with self.condition:
+            return len(self.heap)
+
+    def empty(self):
+        return self.qsize() == 0
@@ -0,0 +1,426 @@
+#!/usr/bin/python
+'''
+Resumable experiment runner for the realtime solver
+
+Runs the domain x subdomain x solver x lookahead x instance sweep of
+singleThread-realtimeSolver.sh through DistLRE. Every run is keyed on a hash
+of the solver binary, its arguments and its instance file; finished runs
+and recorded failures are skipped, so rerunning a partial sweep only runs
+the missing cells.
+'''
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import tempfile
+from json.decoder import JSONDecodeError
+from threading import Lock
+
+from distlre.distlre import DistLRE, Task
+from distlre.scheduler import RuntimeHistory
+
+researchHome = "/home/aifs1/gu/phd/research/workingPaper"
+
+subdomains = {
+    "tile": ["uniform", "heavy", "inverse"],
+    "pancake": ["regular", "heavy"],
+    "racetrack": ["barto-bigger", "hansen-bigger"],
+    "gridPathfinding": ["goalObstacleField", "startObstacleField", "uniform"],
+}
+
+heuristicTypes = {
+    "tile": ["NA"],
+    "pancake": ["gap", "gapm2"],
+    "racetrack": ["dijkstra", "euclidean"],
+    "gridPathfinding": ["NA"],
+}
+
+numberOfInstances = {
+    "tile": 100,
+    "pancake": 100,
+    "racetrack": 25,
+    "gridPathfinding": 100,
+}
+
+pancakeSize = {"regular": "50", "heavy": "16", "sumheavy": "10"}
+
+# subdomains that run an easy instance set of another subdomain
+easyInstanceSet = {
+    "heavy-easy": ("heavy", "slidingTile_tianyi1000-easy-for-heavy"),
+    "inverse-easy": ("inverse", "slidingTile_tianyi1000-easy-for-inverse"),
+    "reverse-easy": ("reverse", "slidingTile_tianyi1000-easy-for-reverse"),
+}
+
+
+def parseArugments():
+
+    parser = argparse.ArgumentParser(description='experimentRunner')
+
+    parser.add_argument(
+        '-d',
+        action='append',
+        dest='domains',
+        help='domain: tile, pancake, racetrack, gridPathfinding(default)',
+        default=[])
+
+    parser.add_argument(
+        '-s',
+        action='append',
+        dest='subdomains',
+        help='subdomain, default: all subdomains of each domain',
+        default=[])
+
+    parser.add_argument(
+        '-u',
+        action='append',
+        dest='solvers',
+        help='solver: one, alltheway, dtrts, default: all',
+        default=[])
+
+    parser.add_argument(
+        '-l',
+        action='append',
+        type=int,
+        dest='lookaheads',
+        help='lookahead, eg: -l 10 -l 30, default: 10',
+        default=[])
+
+    parser.add_argument(
+        '-f',
+        action='store',
+        type=int,
+        dest='first',
+        help='first instance: (default) 1',
+        default=1)
+
+    parser.add_argument(
+        '-n',
+        action='store',
+        type=int,
+        dest='instances',
+        help='number of instances, default: all instances of the domain',
+        default=None)
+
+    parser.add_argument(
+        '-t',
+        action='store',
+        type=int,
+        dest='time',
+        help='time limit:(default) 600 (seconds)',
+        default=600)
+
+    parser.add_argument(
+        '-m',
+        action='store',
+        type=float,
+        dest='memory',
+        help='memory limit:(default) 7 (GB)',
+        default=7)
+
+    parser.add_argument(
+        '-mm',
+        action='store',
+        dest='memoryMode',
+        help='memory limit mode: server, rss(default), rlimit',
+        default='rss')
+
+    parser.add_argument(
+        '-j',
+        action='store',
+        type=int,
+        dest='threads',
+        help='number of concurrent runs:(default) 1',
+        default=1)
+
+    parser.add_argument(
+        '-ex',
+        action='store',
+        dest='algorithmNameExtension',
+        help='algorithm name extension: (default) NA',
+        default='NA')
+
+    parser.add_argument(
+        '-rf',
+        action='store_true',
+        dest='retryFailed',
+        help='rerun cells whose last attempt failed')
+
+    parser.add_argument(
+        '-a',
+        action='store_true',
+        dest='adopt',
+        help='accept valid result files that have no cache record, \
+              eg. from sweeps of singleThread-realtimeSolver.sh')
+
+    parser.add_argument(
+        '-dr',
+        action='store_true',
+        dest='dryRun',
+        help='only print what would run')
+
+    return parser
+
+
+# (file, size, mtime) -> sha256, the binary is hashed once per sweep
+fileDigests = {}
+
+
+def fileDigest(fileName):
+    stat = os.stat(fileName)
+    cacheKey = (fileName, stat.st_size, stat.st_mtime)
+
+    if cacheKey not in fileDigests:
+        sha = hashlib.sha256()
+        with open(fileName, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(block)
+        fileDigests[cacheKey] = sha.hexdigest()
+
+    return fileDigests[cacheKey]
+
+
+def runKey(executable, solverArgs, inputFiles):
+    sha = hashlib.sha256()
+    sha.update(fileDigest(executable).encode())
+    sha.update(json.dumps(solverArgs).encode())
+    for inputFile in inputFiles:
+        sha.update(fileDigest(inputFile).encode())
+    return sha.hexdigest()
+
+
+def isValidResult(outFile):
+    try:
+        with open(outFile) as f:
+            return "solution found" in json.load(f)
+    except (OSError, JSONDecodeError):
+        return False
+
+
+def readRecord(recordFile):
+    try:
+        with open(recordFile) as f:
+            return json.load(f)
+    except (OSError, JSONDecodeError):
+        return None
+
+
+def writeRecord(recordFile, record):
+    fd, tmpFile = tempfile.mkstemp(dir=os.path.dirname(recordFile))
+    with os.fdopen(fd, 'w') as f:
+        json.dump(record, f)
+    os.replace(tmpFile, recordFile)
+
+
+def instanceFile(domain, subdomain, instance):
+    worlds = researchHome + "/realtime-nancy/worlds/"
+
+    if domain == "tile":
+        if subdomain in easyInstanceSet:
+            return worlds + easyInstanceSet[subdomain][1] + \
+                "/" + str(instance) + "-4x4.st"
+        return worlds + "slidingTile/" + str(instance) + "-4x4.st"
+
+    if domain == "pancake":
+        size = pancakeSize[subdomain]
+        return worlds + "pancake/" + size + "/" + str(instance) + "-" + \
+            size + ".pan"
+
+    if domain == "racetrack":
+        return worlds + "racetrack/" + subdomain + "-" + str(instance) + \
+            ".init"
+
+    return worlds + "gridPathfinding/" + subdomain + "/" + str(instance) + \
+        ".gp"
+
+
+def resultFile(domain, subdomain, heuristicType, solverNameInDir,
+               lookahead, instance):
+    outDir = researchHome + "/metareasoning/results/" + domain + "/" + \
+        subdomain + "/"
+
+    if domain in ["pancake", "racetrack"]:
+        outDir += heuristicType + "/"
+
+    outDir += solverNameInDir
+
+    if domain == "tile":
+        return outDir, str(lookahead) + "-size-4-" + str(instance) + ".json"
+
+    if domain == "pancake":
+        return outDir, str(lookahead) + "-size-" + pancakeSize[subdomain] + \
+            "-" + str(instance) + ".json"
+
+    return outDir, str(lookahead) + "-" + str(instance) + ".json"
+
+
+def sweep(args):
+    domains = args.domains or ["gridPathfinding"]
+    solvers = args.solvers or ["one", "alltheway", "dtrts"]
+    lookaheads = args.lookaheads or [10]
+
+    for domain in domains:
+        domainSubdomains = args.subdomains or subdomains[domain]
+        instances = args.instances or numberOfInstances[domain]
+
+        for subdomain in domainSubdomains:
+            heuristics = heuristicTypes[domain]
+            if domain == "pancake" and subdomain != "regular":
+                heuristics = ["gap"]
+
+            for heuristicType in heuristics:
+                for solver in solvers:
+                    for lookahead in lookaheads:
+                        for instance in range(args.first,
+                                              args.first + instances):
+                            yield (domain, subdomain, heuristicType, solver,
+                                   lookahead, instance)
+
+
+def classify(task, outFile):
+    if isinstance(task.output, str) and task.output.startswith("OutOfTime"):
+        return "timeout"
+    if isinstance(task.output, str) and \
+            task.output.startswith("OutOfMemory"):
+        return "memout"
+    if isValidResult(outFile):
+        return "done"
+    return "failed"
+
+
+def recordResult(args, key, recordFile, outFile, oldRecord, statusCount,
+                 statusLock, future):
+    # written as soon as the run ends, so an interrupted sweep keeps it
+    try:
+        task = future.result()
+        status = classify(task, outFile)
+        error = task.error
+    except Exception as e:
+        status = "failed"
+        error = str(e)
+
+    if isinstance(error, bytes):
+        error = error.decode('utf-8', errors='replace')
+
+    with statusLock:
+        statusCount[status] = statusCount.get(status, 0) + 1
+
+    writeRecord(recordFile, {
+        "key": key,
+        "status": status,
+        "output": outFile,
+        "time limit": args.time,
+        "memory limit": args.memory,
+        "attempts": (oldRecord["attempts"] if oldRecord else 0) + 1,
+        "error": error[-2000:] if error else "",
+    })
+
+
+def isSkipped(record, outFile, args):
+    if record is None:
+        return args.adopt and isValidResult(outFile)
+
+    if record["status"] == "done":
+        return isValidResult(outFile)
+
+    if args.retryFailed:
+        return False
+
+    # a run that hit a limit is only worth retrying with a larger limit
+    if record["status"] == "timeout":
+        return record["time limit"] >= args.time
+    if record["status"] == "memout":
+        return record["memory limit"] >= args.memory
+
+    return True
+
+
+def main():
+    parser = parseArugments()
+    args = parser.parse_args()
+    print(args)
+
+    executable = researchHome + "/metareasoning/build_release/bin/realtimeSolver"
+    cacheDir = researchHome + "/metareasoning/results/.runCache"
+    os.makedirs(cacheDir, exist_ok=True)
+
+    executor = DistLRE(local_threads=args.threads, local_mode='async',
+                       memory_mode=args.memoryMode,
+                       runtime_history=RuntimeHistory(
+                           cacheDir + "/runtimeHistory.json"))
+
+    skipped = 0
+    submitted = 0
+    statusCount = {}
+    statusLock = Lock()
+
+    for domain, subdomain, heuristicType, solver, lookahead, instance in \
+            sweep(args):
+
+        solverNameInDir = solver
+        if args.algorithmNameExtension != "NA":
+            solverNameInDir = solver + "-" + args.algorithmNameExtension
+
+        outDir, outName = resultFile(domain, subdomain, heuristicType,
+                                     solverNameInDir, lookahead, instance)
+        outFile = outDir + "/" + outName
+
+        realSubdomain = subdomain
+        if subdomain in easyInstanceSet:
+            realSubdomain = easyInstanceSet[subdomain][0]
+
+        inFile = instanceFile(domain, subdomain, instance)
+        if not os.path.exists(inFile):
+            print("instance not found, skip ", inFile)
+            continue
+
+        inputFiles = [inFile]
+        if domain == "racetrack":
+            inputFiles.append(researchHome +
+                              "/realtime-nancy/worlds/racetrack/map/" +
+                              subdomain + ".track")
+
+        solverArgs = ["-d", domain, "-s", realSubdomain, "-a", solver,
+                      "-l", str(lookahead), "-i", str(instance),
+                      "-f", heuristicType]
+
+        key = runKey(executable, solverArgs, inputFiles)
+        recordFile = cacheDir + "/" + key + ".json"
+        record = readRecord(recordFile)
+
+        if isSkipped(record, outFile, args):
+            skipped += 1
+            continue
+
+        command = executable + " " + " ".join(solverArgs) + \
+            " -o " + outFile + " < " + inFile
+
+        if args.dryRun:
+            print(command)
+            continue
+
+        os.makedirs(outDir, exist_ok=True)
+
+        task = Task(command=command,
+                    meta={"domain": domain, "subdomain": subdomain,
+                          "alg": solver, "lookahead": lookahead,
+                          "instance": instance},
+                    time_limit=args.time, memory_limit=args.memory)
+
+        future = executor.submit(task)
+        future.add_done_callback(functools.partial(
+            recordResult, args, key, recordFile, outFile, record,
+            statusCount, statusLock))
+        submitted += 1
+
+    print("skipped", skipped, "cells, running", submitted)
+
+    executor.execute_tasks()
+    executor.wait()
+
+    print(statusCount)
+
+
+if __name__ == '__main__':
+    main()
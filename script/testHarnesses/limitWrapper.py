@@ -38,6 +38,15 @@ def parseArugments():
         help='time limit:(default) 600 (seconds)',
         default='600')
 
+    parser.add_argument(
+        '-mm',
+        action='store',
+        dest='memoryMode',
+        help='memory limit mode: server(default, total server memory), \
+              rss (resident memory of the command), \
+              rlimit (address space limit of the command)',
+        default='server')
+
     return parser
 
 def main():
@@ -45,7 +54,7 @@ def main():
     args = parser.parse_args()
     print(args)
 
-    executor = DistLRE(local_threads=1)
+    executor = DistLRE(local_threads=1, memory_mode=args.memoryMode)
 
     task = Task(command=args.command, meta='META', time_limit=args.time, memory_limit=args.memory)
     future = executor.submit(task)
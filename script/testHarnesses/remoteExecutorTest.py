@@ -0,0 +1,247 @@
+#!/usr/bin/python
+'''
+RemoteExecutor against a fake paramiko client, transport and channel:
+slots sharing one transport, reconnects on a dropped session, time
+limits, output after the exit status and channels closed on errors
+
+eg:
+python remoteExecutorTest.py
+'''
+
+import os
+import threading
+import time
+import unittest
+
+import paramiko
+
+from distlre import remoteexecutor
+from distlre.distlre import DistLRE, InternalTask, RemoteHost, Task
+from distlre.remoteexecutor import SshConnection, execute_remote_task
+
+
+class FakeChannel:
+    # replays a remote run from a thread started by exec_command, the
+    # way paramiko's transport thread fills the channel buffers
+    def __init__(self, run):
+        self.run = run
+        self.lock = threading.Lock()
+        self.stdout = b''
+        self.stderr = b''
+        self.exit_status = None
+        self.eof_received = False
+        self.closed = False
+        self.command = None
+        self.input = b''
+        # select on the channel wakes up on the read end of this pipe
+        self.read_fd, self.write_fd = os.pipe()
+
+    def fileno(self):
+        return self.read_fd
+
+    def exec_command(self, command):
+        self.command = command
+        threading.Thread(target=self.run, args=(self,), daemon=True).start()
+
+    def sendall(self, data):
+        self.input += data
+
+    def shutdown_write(self):
+        pass
+
+    def deliver(self, stdout=b'', stderr=b'', exit_status=None, eof=False):
+        with self.lock:
+            self.stdout += stdout
+            self.stderr += stderr
+            if exit_status is not None:
+                self.exit_status = exit_status
+            if eof:
+                self.eof_received = True
+            if not self.closed:
+                os.write(self.write_fd, b'.')
+
+    def recv_ready(self):
+        return bool(self.stdout)
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr)
+
+    def recv(self, size):
+        with self.lock:
+            chunk, self.stdout = self.stdout[:size], self.stdout[size:]
+        return chunk
+
+    def recv_stderr(self, size):
+        with self.lock:
+            chunk, self.stderr = self.stderr[:size], self.stderr[size:]
+        return chunk
+
+    def exit_status_ready(self):
+        return self.exit_status is not None
+
+    def recv_exit_status(self):
+        while self.exit_status is None:
+            time.sleep(0.01)
+        return self.exit_status
+
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                os.close(self.read_fd)
+                os.close(self.write_fd)
+
+
+class FakeTransport:
+    def __init__(self, run, failures=0):
+        self.run = run
+        self.failures = failures
+        self.active = True
+        self.channels = []
+
+    def is_active(self):
+        return self.active
+
+    def open_session(self):
+        if self.failures:
+            self.failures -= 1
+            raise paramiko.SSHException('session dropped')
+
+        channel = FakeChannel(self.run)
+        self.channels.append(channel)
+        return channel
+
+
+class FakeClient:
+    def __init__(self, transport):
+        self.transport = transport
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.transport.active = False
+
+
+def finish(stdout=b'', stderr=b'', exit_status=0):
+    def run(channel):
+        channel.deliver(stdout, stderr, exit_status, eof=True)
+    return run
+
+
+class RemoteExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.transports = []
+        self.spawn_ssh_client = remoteexecutor.spawn_ssh_client
+        self.grace = remoteexecutor.REMOTE_TIMEOUT_GRACE
+        remoteexecutor.spawn_ssh_client = self.spawn
+
+        # what the next transport spawned runs, and how many of its
+        # sessions fail to open
+        self.run = finish(b'done')
+        self.failures = []
+
+    def tearDown(self):
+        remoteexecutor.spawn_ssh_client = self.spawn_ssh_client
+        remoteexecutor.REMOTE_TIMEOUT_GRACE = self.grace
+
+    def spawn(self, host):
+        failures = self.failures.pop(0) if self.failures else 0
+        transport = FakeTransport(self.run, failures)
+        self.transports.append(transport)
+        return FakeClient(transport)
+
+    def execute(self, task, connection=None):
+        if connection is None:
+            connection = SshConnection(RemoteHost('fake'))
+
+        internal_task = InternalTask(task)
+        execute_remote_task(connection, internal_task)
+        return internal_task.future
+
+    def test_slots_share_one_transport(self):
+        slots = 3
+        barrier = threading.Barrier(slots, timeout=5)
+
+        def run(channel):
+            # only gets past the barrier if all slots run at once
+            barrier.wait()
+            channel.deliver(b'done', exit_status=0, eof=True)
+        self.run = run
+
+        executor = DistLRE(remote_hosts=[RemoteHost('fake', slots=slots)])
+        futures = [executor.submit(Task('true', 'META', 10, 1))
+                   for _ in range(2 * slots)]
+        executor.execute_tasks()
+        executor.wait()
+
+        for future in futures:
+            self.assertEqual(future.result().output, 'done')
+        self.assertEqual(len(self.transports), 1)
+        self.assertEqual(len(self.transports[0].channels), 2 * slots)
+        self.assertTrue(all(channel.closed
+                            for channel in self.transports[0].channels))
+
+    def test_reconnects_a_dropped_session(self):
+        self.failures = [1]
+        future = self.execute(Task('true', 'META', 10, 1))
+
+        self.assertEqual(future.result().output, 'done')
+        self.assertEqual(len(self.transports), 2)
+        self.assertFalse(self.transports[0].active)
+
+    def test_gives_up_after_one_reconnect(self):
+        self.failures = [1, 1]
+        future = self.execute(Task('true', 'META', 10, 1))
+
+        self.assertIsInstance(future.exception(), paramiko.SSHException)
+
+    def test_time_limit(self):
+        remoteexecutor.REMOTE_TIMEOUT_GRACE = 0
+        self.run = lambda channel: None
+        future = self.execute(Task('sleep 100', 'META', 0.2, 1))
+
+        self.assertTrue(future.result().output.startswith('OutOfTime'))
+        self.assertTrue(self.transports[0].channels[0].closed)
+
+    def test_remote_timeout_status(self):
+        task = Task('sleep 100', 'META', 0, 1)
+        self.run = finish(exit_status=124)
+        future = self.execute(task)
+
+        self.assertTrue(future.result().output.startswith('OutOfTime'))
+        self.assertIn('timeout -k 1 0',
+                      self.transports[0].channels[0].command)
+
+    def test_reads_output_after_the_exit_status(self):
+        def run(channel):
+            channel.deliver(b'head ', exit_status=0)
+            time.sleep(0.2)
+            channel.deliver(b'tail', b'error', eof=True)
+        self.run = run
+
+        task = Task('true', 'META', 10, 1)
+        task.input = b'input'
+        result = self.execute(task).result()
+
+        self.assertEqual(result.output, 'head tail')
+        self.assertEqual(result.error, 'error')
+        self.assertEqual(self.transports[0].channels[0].input, b'input')
+
+    def test_closes_the_channel_on_errors(self):
+        connection = SshConnection(RemoteHost('fake'))
+        channel = connection.open_channel()
+
+        def exec_command(command):
+            raise paramiko.SSHException('session dropped')
+        channel.exec_command = exec_command
+        connection.open_channel = lambda: channel
+
+        future = self.execute(Task('true', 'META', 10, 1), connection)
+
+        self.assertIsInstance(future.exception(), paramiko.SSHException)
+        self.assertTrue(channel.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
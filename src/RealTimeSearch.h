@@ -5,6 +5,7 @@
 #include "expansionAlgorithms/MetaReasonAStar.h"
 #include "learningAlgorithms/MetaReasonDijkstra.h"
 #include "node.h"
+#include "utility/NodePool.h"
 #include "utility/PriorityQueue.h"
 #include "utility/ResultContainer.h"
 #include <functional>
@@ -14,7 +15,7 @@
 #include <vector>
 
 #include <cassert>
-#include <ctime>
+#include <time.h>
 
 #include "utility/debug.h"
 
@@ -29,10 +30,14 @@ public:
     typedef typename Domain::HashState Hash;
     using Node = SearchNode<Domain>;
 
-    RealTimeSearch(Domain& domain_, string decisionModule_, size_t lookahead_)
+    // reuseTree_: start every lookahead from the subtree of the previous
+    // one rooted at the committed node, instead of from scratch (one only)
+    RealTimeSearch(Domain& domain_, string decisionModule_, size_t lookahead_,
+                   bool reuseTree_ = false)
         : domain(domain_)
         , lookahead(lookahead_)
         , decisionModule(decisionModule_)
+        , reuseTree(reuseTree_)
     {
         if (decisionModule == "one" || decisionModule == "alltheway") {
             metaReasonDecisionAlgo =
@@ -42,11 +47,24 @@ public:
             metaReasonDecisionAlgo =
               make_shared<MetaReasonNancyBackup<Domain, Node>>(
                 decisionModule_, domain, lookahead);
+
         } else {
             cerr << "unknown decision module: " << decisionModule << "\n";
             exit(1);
         }
 
+        // alltheway commits to the best frontier node, an unexpanded leaf,
+        // so the subtree rooted at it is that node alone and a reuse run is
+        // a fresh one; dtrts decides from the tree of a fresh lookahead:
+        // when it commits no move, a kept tree either grows over every
+        // iteration (and each replay costs more than a lookahead) or, cut
+        // to a lookahead, is the same tree again and the decision never
+        // changes
+        if (reuseTree && decisionModule != "one") {
+            cerr << "tree reuse is only supported with one\n";
+            exit(1);
+        }
+
         metaReasonExpansionAlgo =
           make_shared<MetaReasonAStar<Domain, Node>>(domain, lookahead, "f");
 
@@ -62,10 +80,10 @@ public:
         ResultContainer res;
 
         shared_ptr<Node> initNode =
-          make_shared<Node>(0, domain.heuristic(domain.getStartState()),
-                            domain.distance(domain.getStartState()),
-                            domain.distanceErr(domain.getStartState()), 0, 0, 0,
-                            domain.getStartState(), nullptr);
+          makeNode<Node>(0, domain.heuristic(domain.getStartState()),
+                         domain.distance(domain.getStartState()),
+                         domain.distanceErr(domain.getStartState()), 0, 0, 0,
+                         domain.getStartState(), nullptr);
 
         int count = 0;
 
@@ -144,7 +162,15 @@ public:
                 }
             }
 
-            restartLists(start);
+            // planning time of this iteration: lookahead, decision and
+            // learning, the time the agent spends before it can move on
+            double iterationStart = threadCpuTime();
+
+            if (reuseTree) {
+                rerootLists(start, res);
+            } else {
+                restartLists(start);
+            }
 
             // Expansion and Decision-making Phase
             // check how many of the prefix should be commit
@@ -209,6 +235,8 @@ public:
 
             // deadend
             if (open.empty()) {
+                res.lookaheadCpuTime.push_back(threadCpuTime() -
+                                               iterationStart);
                 break;
             }
 
@@ -248,6 +276,8 @@ public:
             // LearninH Phase
             metaReasonLearningAlgo->learn(open, closed);
 
+            res.lookaheadCpuTime.push_back(threadCpuTime() - iterationStart);
+
             ++count;
             DEBUG_MSG("iteration: " << count);
         }
@@ -256,6 +286,17 @@ public:
     }
 
 private:
+    // cpu time of the calling thread only; clock() counts the whole
+    // process, so with batch mode or python threads searching alongside it
+    // would add their time to this search's steps
+    static double threadCpuTime()
+    {
+        timespec now;
+        clock_gettime(CLOCK_THREAD_CPUTIME_ID, &now);
+        return static_cast<double>(now.tv_sec) +
+               static_cast<double>(now.tv_nsec) * 1e-9;
+    }
+
     static bool duplicateDetection(
       shared_ptr<Node>                              node,
       unordered_map<State, shared_ptr<Node>, Hash>& closed,
@@ -326,6 +367,107 @@ private:
         closed[start->getState()] = start;
     }
 
+    void rerootLists(shared_ptr<Node> start, ResultContainer& res)
+    {
+        // start is not in the last tree (eg: the first iteration, or after
+        // a goal is committed), there is nothing to reuse
+        auto startIt = closed.find(start->getState());
+        if (startIt == closed.end() || startIt->second != start) {
+            restartLists(start);
+            return;
+        }
+
+        start->markStart();
+        start->resetStartEpsilons();
+
+        unordered_map<Node*, vector<shared_ptr<Node>>> children;
+        for (const auto& entry : closed) {
+            if (entry.second != start && entry.second->getParent()) {
+                children[entry.second->getParent().get()].push_back(
+                  entry.second);
+            }
+        }
+
+        Cost startG = start->getGValue();
+
+        // replay the last search on the subtree of start, best f first, and
+        // keep at most one lookahead of its expanded nodes, so learning and
+        // rerooting cost about as much as on a fresh lookahead; an expanded
+        // node past the budget goes back on open without its children
+        size_t budget = lookahead;
+
+        open.clear();
+        closed.clear();
+
+        PriorityQueue<shared_ptr<Node>> replay(Node::compareNodesF);
+
+        auto keep = [&](shared_ptr<Node> n) {
+            // rebase g on the new start, and take the h learned on the
+            // last iteration (interior nodes only get it in the domain)
+            n->setGValue(n->getGValue() - startG);
+            n->setHValue(domain.heuristic(n->getState()));
+            n->setDValue(domain.distance(n->getState()));
+            n->setDErrValue(domain.distanceErr(n->getState()));
+
+            closed[n->getState()] = n;
+            replay.push(n);
+        };
+
+        keep(start);
+
+        size_t expanded = 0;
+        while (!replay.empty()) {
+            shared_ptr<Node> n = replay.top();
+            replay.pop();
+
+            if (!n->onOpen() && expanded == budget) {
+                n->reOpen();
+            }
+
+            if (n->onOpen()) {
+                open.push(n);
+                continue;
+            }
+
+            ++expanded;
+            auto it = children.find(n.get());
+            if (it != children.end()) {
+                for (auto& child : it->second) {
+                    keep(child);
+                }
+            }
+        }
+
+        start->setParent(nullptr);
+
+        if (start->onOpen()) {
+            return;
+        }
+
+        // start was expanded while it was not marked, so the move back to
+        // its old parent was pruned; generate it now
+        for (State child : domain.successors(start->getState())) {
+            if (closed.find(child) != closed.end()) {
+                continue;
+            }
+
+            shared_ptr<Node> childNode = makeNode<Node>(
+              domain.getEdgeCost(child), domain.heuristic(child),
+              domain.distance(child), domain.distanceErr(child),
+              start->getPathBasedEpsilonH(), start->getPathBasedEpsilonD(),
+              start->getPathBasedExpansionCounter(), child, start);
+
+            open.push(childNode);
+            closed[child] = childNode;
+            res.nodesGenerated++;
+        }
+
+        // nothing left to search below start
+        if (open.empty()) {
+            restartLists(start);
+        }
+    }
+
     void clean()
     {
         // Empty OPEN and CLOSED
@@ -351,4 +493,5 @@ protected:
 
     size_t lookahead;
     string decisionModule;
+    bool   reuseTree;
 };
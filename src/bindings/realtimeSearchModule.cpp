@@ -0,0 +1,230 @@
+#include "../RealTimeSearch.h"
+#include "../domain/GridPathfinding.h"
+#include "../domain/HeavyTilePuzzle.h"
+#include "../domain/InverseTilePuzzle.h"
+#include "../domain/PancakePuzzle.h"
+#include "../domain/RaceTrack.h"
+
+#include <pybind11/numpy.h>
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+
+#include <functional>
+#include <memory>
+#include <sstream>
+#include <string>
+
+namespace py = pybind11;
+using namespace std;
+
+// realtimeSearch python module: parse an instance (or a racetrack map) once
+// and run RealTimeSearch on it in process, as many times as needed.
+//
+// every run searches a fresh copy of the parsed domain, the domains learn
+// their heuristics in place, so runs are independent of each other and can
+// be driven from several python threads, the GIL is released while the
+// search runs.
+
+void checkAlgorithm(const string& alg, bool reuseTree)
+{
+    // RealTimeSearch exits the process on an unknown decision module, and
+    // on tree reuse with anything but one
+    if (alg != "one" && alg != "alltheway" && alg != "dtrts") {
+        throw py::value_error("unknown commit algorithm: " + alg +
+                              ", available: one, alltheway, dtrts");
+    }
+
+    if (reuseTree && alg != "one") {
+        throw py::value_error("tree reuse is only supported with one");
+    }
+}
+
+py::dict parseResult(const ResultContainer& res, bool withVis)
+{
+    // same keys as the performance json of realtimeSolver
+    py::dict record;
+
+    record["node expanded"]     = res.nodesExpanded;
+    record["GAT node expanded"] = res.GATnodesExpanded;
+    record["node generated"]    = res.nodesGenerated;
+    record["solution found"]    = res.solutionFound;
+    record["solution cost"]     = res.solutionCost;
+    record["solution length"]   = res.solutionLength;
+    record["lookahead cpu time"] =
+      py::array_t<double>(static_cast<py::ssize_t>(res.lookaheadCpuTime.size()),
+                          res.lookaheadCpuTime.data());
+    record["epsilon h global"] = res.epsilonHGlobal;
+    record["epsilon d global"] = res.epsilonDGlobal;
+
+    if (withVis) {
+        record["path"]           = res.paths;
+        record["visited"]        = res.visited;
+        record["isKeepThinking"] = res.isKeepThinkingFlags;
+        record["committed"]      = res.committed;
+    }
+
+    return record;
+}
+
+template<class Domain>
+ResultContainer startAlg(shared_ptr<Domain> domain_ptr, const string& alg,
+                         size_t lookahead, bool reuseTree)
+{
+    RealTimeSearch<Domain> searchAlg(*domain_ptr, alg, lookahead, reuseTree);
+
+    return searchAlg.search();
+}
+
+// a parsed instance, copied for every run; Domain is the search interface,
+// the copy keeps the concrete type (eg: heavy tile)
+template<class Domain>
+class Instance
+{
+public:
+    template<class Concrete>
+    explicit Instance(shared_ptr<Concrete> prototype_)
+        : prototype(prototype_)
+        , copyDomain([prototype_]() -> shared_ptr<Domain> {
+            return make_shared<Concrete>(*prototype_);
+        })
+    {
+    }
+
+    py::dict search(const string& alg, size_t lookahead, bool withVis,
+                    bool reuseTree)
+    {
+        checkAlgorithm(alg, reuseTree);
+
+        ResultContainer res;
+        {
+            py::gil_scoped_release release;
+            res = startAlg<Domain>(copyDomain(), alg, lookahead, reuseTree);
+        }
+
+        return parseResult(res, withVis);
+    }
+
+private:
+    shared_ptr<Domain>             prototype;
+    function<shared_ptr<Domain>()> copyDomain;
+};
+
+// a parsed racetrack map, every run copies it and sets the initial state of
+// its instance on the copy
+class RaceTrackMap
+{
+public:
+    explicit RaceTrackMap(const string& map)
+    {
+        istringstream mapStream(map);
+        prototype = make_shared<RaceTrack>(mapStream);
+    }
+
+    py::dict search(const string& instance, const string& alg, size_t lookahead,
+                    bool withVis, bool reuseTree)
+    {
+        checkAlgorithm(alg, reuseTree);
+
+        ResultContainer res;
+        {
+            py::gil_scoped_release release;
+
+            auto          world = make_shared<RaceTrack>(*prototype);
+            istringstream instanceStream(instance);
+            world->setInitialState(instanceStream);
+
+            res = startAlg<RaceTrack>(world, alg, lookahead, reuseTree);
+        }
+
+        return parseResult(res, withVis);
+    }
+
+private:
+    shared_ptr<RaceTrack> prototype;
+};
+
+Instance<SlidingTilePuzzle> makeTile(const string& instance,
+                                     const string& subdomain)
+{
+    istringstream input(instance);
+
+    if (subdomain == "uniform") {
+        return Instance<SlidingTilePuzzle>(
+          make_shared<SlidingTilePuzzle>(input));
+    } else if (subdomain == "heavy") {
+        return Instance<SlidingTilePuzzle>(make_shared<HeavyTilePuzzle>(input));
+    } else if (subdomain == "inverse") {
+        return Instance<SlidingTilePuzzle>(
+          make_shared<InverseTilePuzzle>(input));
+    }
+
+    throw py::value_error("unknown tile subdomain: " + subdomain +
+                          ", available: uniform, heavy, inverse");
+}
+
+Instance<PancakePuzzle> makePancake(const string& instance,
+                                    const string& subdomain)
+{
+    istringstream input(instance);
+    auto          world = make_shared<PancakePuzzle>(input);
+
+    if (subdomain == "heavy") {
+        world->setPuzzleVariant(1);
+    } else if (subdomain == "sumheavy") {
+        world->setPuzzleVariant(2);
+    } else if (subdomain != "regular") {
+        throw py::value_error("unknown pancake subdomain: " + subdomain +
+                              ", available: regular, heavy, sumheavy");
+    }
+
+    return Instance<PancakePuzzle>(world);
+}
+
+Instance<GridPathfinding> makeGridPathfinding(const string& instance)
+{
+    istringstream input(instance);
+
+    return Instance<GridPathfinding>(make_shared<GridPathfinding>(input));
+}
+
+template<class Domain>
+void bindInstance(py::module& m, const char* name)
+{
+    py::class_<Instance<Domain>>(m, name).def(
+      "search", &Instance<Domain>::search, py::arg("alg"), py::arg("lookahead"),
+      py::arg("vis") = false, py::arg("reuseTree") = false,
+      "run one search on a fresh copy of the instance, returns the "
+      "performance record as a dict; the gil is released while it "
+      "runs, and its lookahead cpu time counts only the searching "
+      "thread, so searches in concurrent threads do not inflate it");
+}
+
+PYBIND11_MODULE(realtimeSearch, m)
+{
+    m.doc() = "in process realtime search runs, one parse per instance";
+
+    bindInstance<SlidingTilePuzzle>(m, "TileInstance");
+    bindInstance<PancakePuzzle>(m, "PancakeInstance");
+    bindInstance<GridPathfinding>(m, "GridPathfindingInstance");
+
+    m.def("tile", &makeTile, py::arg("instance"),
+          py::arg("subdomain") = "uniform",
+          "parse a sliding tile instance given as the text of its .st file");
+
+    m.def("pancake", &makePancake, py::arg("instance"),
+          py::arg("subdomain") = "regular",
+          "parse a pancake instance given as the text of its .pan file");
+
+    m.def("gridPathfinding", &makeGridPathfinding, py::arg("instance"),
+          "parse a grid pathfinding instance given as the text of its .gp "
+          "file");
+
+    py::class_<RaceTrackMap>(m, "RaceTrackMap")
+      .def(py::init<const string&>(), py::arg("map"),
+           "parse a racetrack map given as the text of its .track file")
+      .def("search", &RaceTrackMap::search, py::arg("instance"), py::arg("alg"),
+           py::arg("lookahead"), py::arg("vis") = false,
+           py::arg("reuseTree") = false,
+           "run one search of an instance (the text of its .init file) on a "
+           "fresh copy of the map, returns the performance record as a dict");
+}
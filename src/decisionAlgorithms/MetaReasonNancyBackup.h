@@ -356,7 +356,8 @@ protected:
         return dist;
     }
 
-    double expectedMinimum(DiscreteDistribution d1, DiscreteDistribution d2)
+    double expectedMinimum(const DiscreteDistribution& d1,
+                           const DiscreteDistribution& d2)
     {
         double expMin = 0;
 
@@ -373,7 +374,8 @@ protected:
     }
 
     // probability of choose d1
-    double pChoose(DiscreteDistribution d1, DiscreteDistribution d2)
+    double pChoose(const DiscreteDistribution& d1,
+                   const DiscreteDistribution& d2)
     {
         double prob = 0;
 
@@ -117,10 +117,17 @@ public:
         /*}*/
     };
 
-    RaceTrack(std::ifstream& raceMap, std::istream& initialState)
+    RaceTrack(std::istream& raceMap, std::istream& initialState)
+        : RaceTrack(raceMap)
     {
-        parseMap(raceMap);
         resetInitialState(initialState);
+    }
+
+    // the track only, for running many instances on one parsed map: copy
+    // it and set the initial state of the instance on the copy
+    explicit RaceTrack(std::istream& raceMap)
+    {
+        parseMap(raceMap);
         initilaizeActions();
         computeDijkstraMap();
         computeEuclideanMap();
@@ -130,6 +137,11 @@ public:
 
     void setVariant(int variant) { heuristicVariant = variant; }
 
+    void setInitialState(std::istream& initialState)
+    {
+        resetInitialState(initialState);
+    }
+
     bool isGoal(const State& s) const
     {
         Location loc = Location(s.getX(), s.getY());
@@ -369,7 +381,7 @@ public:
     string getSubDomainName() const { return ""; }
 
 private:
-    void parseMap(std::ifstream& raceMap)
+    void parseMap(std::istream& raceMap)
     {
         string line;
         getline(raceMap, line);
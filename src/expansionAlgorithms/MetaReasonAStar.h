@@ -1,4 +1,5 @@
 #pragma once
+#include "../utility/NodePool.h"
 #include "../utility/PriorityQueue.h"
 #include "../utility/ResultContainer.h"
 #include "../utility/debug.h"
@@ -20,6 +21,7 @@ public:
         : domain(domain_)
         , lookahead(lookahead_)
         , sortingFunction(sorting_)
+        , epsilonCounter(0)
     {}
 
     void expand(
@@ -92,7 +94,7 @@ public:
             vector<shared_ptr<Node>> childrenNodes;
 
             for (State child : children) {
-                shared_ptr<Node> childNode = make_shared<Node>(
+                shared_ptr<Node> childNode = makeNode<Node>(
                   cur->getGValue() + domain.getEdgeCost(child),
                   domain.heuristic(child), domain.distance(child),
                   domain.distanceErr(child), cur->getPathBasedEpsilonH(),
@@ -124,6 +126,13 @@ public:
                 for (auto child : childrenNodes) {
                     child->pushPathBasedEpsilons(epsH, epsD);
                 }
+
+                // global one-step errors: running mean over every expansion
+                ++epsilonCounter;
+                res.epsilonHGlobal += (epsH - res.epsilonHGlobal) /
+                                      static_cast<double>(epsilonCounter);
+                res.epsilonDGlobal += (epsD - res.epsilonDGlobal) /
+                                      static_cast<double>(epsilonCounter);
             }
         }
 
@@ -143,4 +152,5 @@ protected:
     Domain& domain;
     size_t  lookahead;
     string  sortingFunction;
+    size_t  epsilonCounter;
 };
@@ -4,14 +4,19 @@
 #include "domain/InverseTilePuzzle.h"
 #include "domain/PancakePuzzle.h"
 #include "domain/RaceTrack.h"
+#include "utility/VisWriter.h"
 
 #include <cxxopts.hpp>
 #include <nlohmann/json.hpp>
 
+#include <atomic>
 #include <fstream>
+#include <functional>
 #include <iostream>
 #include <memory>
+#include <mutex>
 #include <string>
+#include <thread>
 
 using namespace std;
 
@@ -21,17 +26,21 @@ nlohmann::json parseResult(const ResultContainer&      res,
 
     nlohmann::json record;
 
-    record["node expanded"]     = res.nodesExpanded;
-    record["GAT node expanded"] = res.GATnodesExpanded;
-    record["node generated"]    = res.nodesGenerated;
-    record["solution found"]    = res.solutionFound;
-    record["solution cost"]     = res.solutionCost;
-    record["solution length"]   = res.solutionLength;
-    record["instance"]          = args["instance"].as<std::string>();
-    record["algorithm"]         = args["alg"].as<std::string>();
-    record["lookahead"]         = args["lookahead"].as<int>();
-    record["domain"]            = args["domain"].as<std::string>();
-    record["subdomain"]         = args["subdomain"].as<std::string>();
+    record["node expanded"]      = res.nodesExpanded;
+    record["GAT node expanded"]  = res.GATnodesExpanded;
+    record["node generated"]     = res.nodesGenerated;
+    record["solution found"]     = res.solutionFound;
+    record["solution cost"]      = res.solutionCost;
+    record["solution length"]    = res.solutionLength;
+    record["instance"]           = args["instance"].as<std::string>();
+    record["algorithm"]          = args["alg"].as<std::string>();
+    record["lookahead"]          = args["lookahead"].as<int>();
+    record["domain"]             = args["domain"].as<std::string>();
+    record["subdomain"]          = args["subdomain"].as<std::string>();
+    record["lookahead cpu time"] = res.lookaheadCpuTime;
+    record["epsilon h global"]   = res.epsilonHGlobal;
+    record["epsilon d global"]   = res.epsilonDGlobal;
+    record["reuse tree"]         = args["reuseTree"].as<bool>();
 
     return record;
 }
@@ -51,15 +60,243 @@ nlohmann::json parseVisResult(const ResultContainer& res)
 
 template<class Domain>
 ResultContainer startAlg(shared_ptr<Domain> domain_ptr, string decisionModule,
-                         size_t lookahead)
+                         size_t lookahead, bool reuseTree)
 {
     shared_ptr<RealTimeSearch<Domain>> searchAlg =
       make_shared<RealTimeSearch<Domain>>(*domain_ptr, decisionModule,
-                                          lookahead);
+                                          lookahead, reuseTree);
 
     return searchAlg->search();
 }
 
+string raceTrackMapFile(const string& subDomain)
+{
+    return "/home/aifs1/gu/phd/research/workingPaper/"
+           "realtime-nancy/worlds/racetrack/map/" +
+           subDomain + ".track";
+}
+
+// batch mode: every instance of the manifest is parsed once and each
+// (algorithm, lookahead) cell runs on a fresh copy of it, the domains learn
+// their heuristics in place
+struct BatchManifest
+{
+    vector<string> instances;
+    vector<string> algorithms;
+    vector<int>    lookaheads;
+};
+
+BatchManifest readManifest(const string& manifestFile)
+{
+    ifstream manifestStream(manifestFile);
+
+    if (!manifestStream.good()) {
+        cerr << "manifest file not exist: " << manifestFile << endl;
+        exit(1);
+    }
+
+    nlohmann::json manifestJson;
+    manifestStream >> manifestJson;
+
+    BatchManifest manifest;
+    manifest.instances  = manifestJson["instances"].get<vector<string>>();
+    manifest.algorithms = manifestJson["algorithms"].get<vector<string>>();
+    manifest.lookaheads = manifestJson["lookaheads"].get<vector<int>>();
+
+    for (const auto& alg : manifest.algorithms) {
+        if (alg != "one" && alg != "alltheway" && alg != "dtrts") {
+            cerr << "unknown decision module: " << alg << "\n";
+            exit(1);
+        }
+    }
+
+    return manifest;
+}
+
+class BatchRunner
+{
+public:
+    BatchRunner(const BatchManifest&        manifest_,
+                const cxxopts::ParseResult& args_, ostream& out_)
+        : manifest(manifest_)
+        , args(args_)
+        , out(out_)
+        , nextInstance(0)
+    {
+        if (args["domain"].as<std::string>() == "racetrack") {
+            string mapFile =
+              raceTrackMapFile(args["subdomain"].as<std::string>());
+            ifstream map(mapFile);
+
+            if (!map.good()) {
+                cerr << "map file not exist: " << mapFile << endl;
+                exit(1);
+            }
+
+            raceTrackMap = make_shared<RaceTrack>(map);
+        }
+    }
+
+    void run(size_t jobs)
+    {
+        // a worker takes the next instance and runs all of its cells
+        vector<thread> workers;
+        for (size_t i = 1; i < jobs; ++i) {
+            workers.emplace_back([this]() { work(); });
+        }
+
+        work();
+
+        for (auto& worker : workers) {
+            worker.join();
+        }
+    }
+
+private:
+    void work()
+    {
+        size_t i;
+        while ((i = nextInstance++) < manifest.instances.size()) {
+            runInstance(manifest.instances[i]);
+        }
+    }
+
+    void runInstance(const string& instanceFile)
+    {
+        auto domain    = args["domain"].as<std::string>();
+        auto subDomain = args["subdomain"].as<std::string>();
+
+        ifstream input(instanceFile);
+
+        if (!input.good()) {
+            lock_guard<mutex> lock(outMutex);
+            cerr << "instance file not exist: " << instanceFile << endl;
+            return;
+        }
+
+        // the domain constructors are not thread safe (eg: the tile hash
+        // table is filled by the first one)
+        unique_lock<mutex> parseLock(parseMutex);
+
+        if (domain == "tile") {
+            if (subDomain == "heavy") {
+                runCells<SlidingTilePuzzle>(
+                  copier<SlidingTilePuzzle, HeavyTilePuzzle>(input),
+                  instanceFile, parseLock);
+            } else if (subDomain == "inverse") {
+                runCells<SlidingTilePuzzle>(
+                  copier<SlidingTilePuzzle, InverseTilePuzzle>(input),
+                  instanceFile, parseLock);
+            } else {
+                runCells<SlidingTilePuzzle>(
+                  copier<SlidingTilePuzzle, SlidingTilePuzzle>(input),
+                  instanceFile, parseLock);
+            }
+        } else if (domain == "pancake") {
+            auto world = make_shared<PancakePuzzle>(input);
+
+            if (subDomain == "heavy") {
+                world->setPuzzleVariant(1);
+            } else if (subDomain == "sumheavy") {
+                world->setPuzzleVariant(2);
+            }
+
+            runCells<PancakePuzzle>(
+              [world]() { return make_shared<PancakePuzzle>(*world); },
+              instanceFile, parseLock);
+        } else if (domain == "racetrack") {
+            auto world = make_shared<RaceTrack>(*raceTrackMap);
+            world->setInitialState(input);
+
+            runCells<RaceTrack>(
+              [world]() { return make_shared<RaceTrack>(*world); },
+              instanceFile, parseLock);
+        } else if (domain == "gridPathfinding") {
+            runCells<GridPathfinding>(
+              copier<GridPathfinding, GridPathfinding>(input), instanceFile,
+              parseLock);
+        }
+    }
+
+    template<class Domain, class Concrete>
+    function<shared_ptr<Domain>()> copier(istream& input)
+    {
+        auto world = make_shared<Concrete>(input);
+
+        return [world]() -> shared_ptr<Domain> {
+            return make_shared<Concrete>(*world);
+        };
+    }
+
+    template<class Domain>
+    void runCells(function<shared_ptr<Domain>()> copyDomain,
+                  const string& instanceFile, unique_lock<mutex>& parseLock)
+    {
+        parseLock.unlock();
+
+        string instance = instanceFile.substr(instanceFile.rfind('/') + 1);
+
+        for (const auto& alg : manifest.algorithms) {
+            for (int lookahead : manifest.lookaheads) {
+                ResultContainer res = startAlg<Domain>(
+                  copyDomain(), alg, static_cast<size_t>(lookahead),
+                  args["reuseTree"].as<bool>());
+
+                nlohmann::json record = parseResult(res, args);
+                record["instance"]    = instance;
+                record["algorithm"]   = alg;
+                record["lookahead"]   = lookahead;
+
+                lock_guard<mutex> lock(outMutex);
+                out << record << "\n";
+                out.flush();
+            }
+        }
+    }
+
+    const BatchManifest&        manifest;
+    const cxxopts::ParseResult& args;
+    ostream&                    out;
+    shared_ptr<RaceTrack>       raceTrackMap;
+    atomic<size_t>              nextInstance;
+    mutex                       parseMutex;
+    mutex                       outMutex;
+};
+
+void runBatch(const cxxopts::ParseResult& args)
+{
+    BatchManifest manifest = readManifest(args["batch"].as<std::string>());
+
+    // fail before any cell runs, RealTimeSearch would exit on the first
+    // alltheway or dtrts cell
+    if (args["reuseTree"].as<bool>()) {
+        for (const auto& alg : manifest.algorithms) {
+            if (alg != "one") {
+                cerr << "tree reuse is only supported with one\n";
+                exit(1);
+            }
+        }
+    }
+
+    // the records go to stdout or -o, everything else the solver prints
+    // (eg: the domain parsers) to stderr, so the output stays ndjson
+    ostream  stdoutStream(cout.rdbuf());
+    ofstream fileStream;
+    ostream* out = &stdoutStream;
+
+    if (args.count("performenceOut")) {
+        fileStream.open(args["performenceOut"].as<std::string>());
+        out = &fileStream;
+    }
+
+    cout.rdbuf(cerr.rdbuf());
+
+    BatchRunner runner(manifest, args, *out);
+    runner.run(static_cast<size_t>(max(args["jobs"].as<int>(), 1)));
+
+    cout.rdbuf(stdoutStream.rdbuf());
+}
+
 int main(int argc, char** argv)
 {
     cxxopts::Options options("./realtimeSolver",
@@ -98,6 +335,27 @@ int main(int argc, char** argv)
     optionAdder("v,visOut", "visulization Out file",
                 cxxopts::value<std::string>());
 
+    optionAdder("visFormat",
+                "visulization Out file format: json, binary (compact, "
+                "memory mappable, read by script/plot/visReader.py)",
+                cxxopts::value<std::string>()->default_value("json"));
+
+    optionAdder("b,batch",
+                "batch manifest, json: {\"instances\": [instance files], "
+                "\"algorithms\": [...], \"lookaheads\": [...]}; every "
+                "instance is parsed once, one ndjson record per run goes to "
+                "-o or stdout",
+                cxxopts::value<std::string>());
+
+    optionAdder("j,jobs", "batch mode: number of search threads",
+                cxxopts::value<int>()->default_value("1"));
+
+    optionAdder("r,reuseTree",
+                "start every lookahead from the search tree of the last one, "
+                "rerooted at the committed node, instead of from scratch; "
+                "one only",
+                cxxopts::value<bool>()->default_value("false"));
+
     optionAdder("h,help", "Print usage");
 
     auto args = options.parse(argc, argv);
@@ -107,10 +365,16 @@ int main(int argc, char** argv)
         exit(0);
     }
 
+    if (args.count("batch")) {
+        runBatch(args);
+        return 0;
+    }
+
     auto domain         = args["domain"].as<std::string>();
     auto subDomain      = args["subdomain"].as<std::string>();
     auto alg            = args["alg"].as<std::string>();
     auto lookaheadDepth = static_cast<size_t>(args["lookahead"].as<int>());
+    auto reuseTree      = args["reuseTree"].as<bool>();
 
     ResultContainer res;
 
@@ -126,7 +390,8 @@ int main(int argc, char** argv)
             world = std::make_shared<InverseTilePuzzle>(cin);
         }
 
-        res = startAlg<SlidingTilePuzzle>(world, alg, lookaheadDepth);
+        res =
+          startAlg<SlidingTilePuzzle>(world, alg, lookaheadDepth, reuseTree);
 
     } else if (domain == "pancake") {
         std::shared_ptr<PancakePuzzle> world =
@@ -138,12 +403,10 @@ int main(int argc, char** argv)
             world->setPuzzleVariant(2);
         }
 
-        res = startAlg<PancakePuzzle>(world, alg, lookaheadDepth);
+        res = startAlg<PancakePuzzle>(world, alg, lookaheadDepth, reuseTree);
     } else if (domain == "racetrack") {
 
-        string mapFile = "/home/aifs1/gu/phd/research/workingPaper/"
-                         "realtime-nancy/worlds/racetrack/map/" +
-                         subDomain + ".track";
+        string mapFile = raceTrackMapFile(subDomain);
 
         ifstream map(mapFile);
 
@@ -155,7 +418,7 @@ int main(int argc, char** argv)
         std::shared_ptr<RaceTrack> world =
           std::make_shared<RaceTrack>(map, cin);
 
-        res = startAlg<RaceTrack>(world, alg, lookaheadDepth);
+        res = startAlg<RaceTrack>(world, alg, lookaheadDepth, reuseTree);
     } else if (domain == "gridPathfinding") {
 
         /*string mapFile =*/
@@ -173,7 +436,7 @@ int main(int argc, char** argv)
         std::shared_ptr<GridPathfinding> world =
           std::make_shared<GridPathfinding>(cin);
 
-        res = startAlg<GridPathfinding>(world, alg, lookaheadDepth);
+        res = startAlg<GridPathfinding>(world, alg, lookaheadDepth, reuseTree);
     } else {
         cout << "Available domains are TreeWorld, slidingTile, pancake, "
                 "racetrack, gridPathfinding"
@@ -196,9 +459,16 @@ int main(int argc, char** argv)
 
     // dumpout solution path
     if (args.count("visOut")) {
-        ofstream vout(args["visOut"].as<std::string>());
-        auto     visJson = parseVisResult(res);
-        vout << visJson;
-        vout.close();
+        if (args["visFormat"].as<std::string>() == "binary") {
+            ofstream  vout(args["visOut"].as<std::string>(), ios::binary);
+            VisWriter visWriter;
+            visWriter.write(res, vout);
+            vout.close();
+        } else {
+            ofstream vout(args["visOut"].as<std::string>());
+            auto     visJson = parseVisResult(res);
+            vout << visJson;
+            vout.close();
+        }
     }
 }
@@ -1,7 +1,6 @@
 #pragma once
 #include <memory>
 
-#include "utility/DiscreteDistribution.h"
 #include "utility/debug.h"
 
 using namespace std;
@@ -13,13 +12,12 @@ class SearchNode
     typedef typename Domain::Cost      Cost;
     typedef typename Domain::HashState Hash;
 
-    Cost                 g;
-    Cost                 h;
-    Cost                 d;
-    Cost                 derr;
-    bool                 open;
-    unsigned int         delayCntr;
-    DiscreteDistribution distribution;
+    Cost         g;
+    Cost         h;
+    Cost         d;
+    Cost         derr;
+    bool         open;
+    unsigned int delayCntr;
 
     double startEpsilonH;
     double startEpsilonD;
@@ -56,34 +56,11 @@ public:
     ~DiscreteDistribution() {}
 
 private:
-    struct ProbabilityPair
-    {
-        ProbabilityNode  first;
-        ProbabilityNode  second;
-        ProbabilityPair* left  = NULL;
-        ProbabilityPair* right = NULL;
-
-        ProbabilityPair(ProbabilityNode lower_, ProbabilityNode upper_)
-            : first(lower_)
-            , second(upper_)
-            , left(NULL)
-            , right(NULL)
-        {}
-    };
-
-    struct CompareDistance
-    {
-        bool operator()(ProbabilityPair* p1, ProbabilityPair* p2)
-        {
-            return (p1->second.cost - p1->first.cost) >
-                   (p2->second.cost - p2->first.cost);
-        }
-    };
-
-    set<ProbabilityNode> distribution;
-    size_t               maxSamples;
-    double               var;
-    double               mean;
+    // distribution is kept sorted by cost, with at most one bucket per cost
+    vector<ProbabilityNode> distribution;
+    size_t                  maxSamples;
+    double                  var;
+    double                  mean;
 
     double probabilityDensityFunction(double x, double mu, double var_)
     {
@@ -91,94 +68,91 @@ private:
                 exp(-(pow(x - mu, 2) / (2 * var_))));
     }
 
-    void resize(map<double, double>& distroMap)
+    // sort by cost, the first bucket of a cost wins (as a set would keep it)
+    static void sortUnique(vector<ProbabilityNode>& nodes)
+    {
+        if (!is_sorted(nodes.begin(), nodes.end())) {
+            stable_sort(nodes.begin(), nodes.end());
+        }
+
+        nodes.erase(
+          unique(nodes.begin(), nodes.end(),
+                 [](const ProbabilityNode& a, const ProbabilityNode& b) {
+                     return a.cost == b.cost;
+                 }),
+          nodes.end());
+    }
+
+    // merge the closest adjacent buckets of the sorted buckets, in place,
+    // until there are at most maxSamples of them
+    void resize(vector<ProbabilityNode>& buckets)
     {
         // Maybe we don't need to merge any buckets...
-        if (distroMap.size() <= maxSamples) {
+        if (buckets.size() <= maxSamples) {
             return;
         }
 
-        // Gotta merge some buckets...
-        priority_queue<ProbabilityPair*, vector<ProbabilityPair*>,
-                       CompareDistance>
-          heap;
-
-        // Groups probabilities into adjacent pairs and does some pointer
-        // assignment for tracking merges
-        int              cnt = 0;
-        ProbabilityNode  lastNode;
-        ProbabilityPair* lastPair = NULL;
-        for (map<double, double>::iterator it = distroMap.begin();
-             it != distroMap.end(); it++) {
-            ProbabilityNode n(it->first, it->second);
-
-            if (cnt == 0) {
-                cnt++;
-                lastNode = n;
-                continue;
-            }
+        // pair j is the bucket j and the live bucket before it, a merge
+        // keeps the result in the left slot, so the pairs around it keep
+        // their index and just see the merged bucket
+        size_t         n = buckets.size();
+        vector<size_t> prev(n), next(n);
+        for (size_t i = 0; i < n; ++i) {
+            prev[i] = i - 1;
+            next[i] = i + 1;
+        }
+
+        auto gap = [&buckets, &prev](size_t j) {
+            return buckets[j].cost - buckets[prev[j]].cost;
+        };
 
-            ProbabilityPair* p = new ProbabilityPair(lastNode, n);
-            heap.push(p);
+        // the pair with the lowest distance between buckets on top
+        auto compareDistance = [&gap](size_t j1, size_t j2) {
+            return gap(j1) > gap(j2);
+        };
 
-            p->left  = lastPair;
-            p->right = NULL;
-            if (lastPair)
-                lastPair->right = p;
-            lastPair = p;
-            lastNode = n;
-            cnt++;
+        priority_queue<size_t, vector<size_t>, decltype(compareDistance)> heap(
+          compareDistance);
+
+        for (size_t j = 1; j < n; ++j) {
+            heap.push(j);
         }
 
+        vector<bool> merged(n, false);
+        size_t       size = n;
+
         // Now, while we still have too many samples, and the heap isn't empty,
         // merge buckets
-        while (distroMap.size() > maxSamples && !heap.empty()) {
-            // Get the pair with the lowest distance between buckets
-            ProbabilityPair* merge = heap.top();
+        while (size > maxSamples && !heap.empty()) {
+            size_t right = heap.top();
             heap.pop();
+            size_t left = prev[right];
 
             // Calculate the new probability and X of the merged bucket
             double newProb =
-              merge->first.probability + merge->second.probability;
+              buckets[left].probability + buckets[right].probability;
             double newX =
-              (merge->first.probability / newProb) * merge->first.cost +
-              (merge->second.probability / newProb) * merge->second.cost;
-
-            ProbabilityNode newNode(newX, newProb);
+              (buckets[left].probability / newProb) * buckets[left].cost +
+              (buckets[right].probability / newProb) * buckets[right].cost;
 
-            // Either add this probability to the existing bucket or make a new
-            // bucket for it
-            distroMap[newX] += newProb;
+            buckets[left] = ProbabilityNode(newX, newProb);
 
-            // Remove the old probabilities
-            distroMap.erase(merge->first.cost);
-            distroMap.erase(merge->second.cost);
-
-            // If merge has a pair on its left, update it
-            if (merge->left) {
-                merge->left->second = newNode;
-                merge->left->right  = merge->right;
-            }
-            // If merge has a pair on its right, update it
-            if (merge->right) {
-                merge->right->first = newNode;
-                merge->right->left  = merge->left;
+            // unlink the right bucket
+            merged[right] = true;
+            next[left]    = next[right];
+            if (next[right] < n) {
+                prev[next[right]] = left;
             }
-
-            // Delete the merged pair
-            delete merge;
+            --size;
         }
 
-        // Delete everything on the heap
-        while (!heap.empty()) {
-            ProbabilityPair* p = heap.top();
-            heap.pop();
-            delete p;
+        size_t live = 0;
+        for (size_t i = 0; i < n; ++i) {
+            if (!merged[i]) {
+                buckets[live++] = buckets[i];
+            }
         }
-
-        // If we still have too many samples, do it again
-        if (distroMap.size() > maxSamples)
-            resize(distroMap);
+        buckets.resize(live);
     }
 
 public:
@@ -195,7 +169,7 @@ public:
     {
         // This is a goal node, belief is a spike at true value
         if (var == 0) {
-            distribution.insert(ProbabilityNode(mean, 1.0));
+            distribution.push_back(ProbabilityNode(mean, 1.0));
             return;
         }
 
@@ -210,7 +184,7 @@ public:
 
         double probSum = 0.0;
 
-        vector<ProbabilityNode> tmp;
+        distribution.reserve(maxSamples);
 
         // Take the samples and build the discrete distribution
         for (size_t i = 0; i < maxSamples; i++) {
@@ -223,19 +197,18 @@ public:
 
             probSum += prob;
 
-            ProbabilityNode node(currentX, prob);
-
-            tmp.push_back(node);
+            distribution.push_back(ProbabilityNode(currentX, prob));
 
             currentX += sampleStepSize;
         }
 
         // Normalize the distribution probabilities
-        for (ProbabilityNode& n : tmp) {
+        for (ProbabilityNode& n : distribution) {
             if (probSum > 0.0 && n.probability != 1.0)
                 n.probability = n.probability / probSum;
-            distribution.insert(n);
         }
+
+        sortUnique(distribution);
     }
 
     double expectedCost() const { return mean; }
@@ -259,36 +232,49 @@ public:
     {
         DiscreteDistribution csernaDistro(min(maxSamples, rhs.maxSamples));
 
-        map<double, double> results;
+        vector<ProbabilityNode> results;
+        results.reserve(distribution.size() * rhs.distribution.size());
 
-        for (ProbabilityNode n1 : distribution) {
-            for (ProbabilityNode n2 : rhs.distribution) {
+        for (const ProbabilityNode& n1 : distribution) {
+            for (const ProbabilityNode& n2 : rhs.distribution) {
                 double probability = (n1.probability * n2.probability);
 
                 // Don't add to the distribution if the probability of this cost
                 // is 0
                 if (probability > 0)
-                    results[min(n1.cost, n2.cost)] += probability;
+                    results.push_back(
+                      ProbabilityNode(min(n1.cost, n2.cost), probability));
             }
         }
 
-        csernaDistro.resize(results);
+        // one bucket per cost, summed in the order they were generated
+        stable_sort(results.begin(), results.end());
 
-        for (map<double, double>::iterator it = results.begin();
-             it != results.end(); it++) {
-            csernaDistro.distribution.insert(
-              ProbabilityNode(it->first, it->second));
+        size_t buckets = 0;
+        for (size_t i = 0; i < results.size(); ++i) {
+            if (buckets > 0 && results[buckets - 1].cost == results[i].cost) {
+                results[buckets - 1].probability += results[i].probability;
+            } else {
+                results[buckets++] = results[i];
+            }
         }
+        results.resize(buckets);
+
+        csernaDistro.resize(results);
+        csernaDistro.distribution = move(results);
 
         return csernaDistro;
     }
 
-    set<ProbabilityNode>::iterator begin() const
+    vector<ProbabilityNode>::const_iterator begin() const
     {
         return distribution.begin();
     }
 
-    set<ProbabilityNode>::iterator end() const { return distribution.end(); }
+    vector<ProbabilityNode>::const_iterator end() const
+    {
+        return distribution.end();
+    }
 
     size_t getDistSize() const { return distribution.size(); }
 
@@ -0,0 +1,172 @@
+#pragma once
+#include <algorithm>
+#include <cstddef>
+#include <memory>
+#include <utility>
+#include <vector>
+
+using namespace std;
+
+// Pooled allocation of the search nodes, on with -DUSE_NODE_POOL=ON.
+//
+// restartLists drops every node of a lookahead iteration at once and the
+// next iteration allocates as many again. With the pool, allocate_shared
+// puts a node and its control block in one block carved from a large slab,
+// a freed block goes on the free list of its size and the next node of that
+// size reuses it, so an iteration costs no malloc/free once the slabs are
+// big enough for the largest lookahead.
+//
+// Pools are per thread (batch mode and the python module search on several
+// threads), a node must be released on the thread that made it, which holds
+// as a search never hands its nodes to another thread.
+class NodePool
+{
+public:
+    static void* allocate(size_t bytes)
+    {
+        return threadPool().take(roundUp(bytes));
+    }
+
+    static void deallocate(void* block, size_t bytes) noexcept
+    {
+        threadPool().give(block, roundUp(bytes));
+    }
+
+    NodePool() = default;
+
+    NodePool(const NodePool&) = delete;
+
+    NodePool& operator=(const NodePool&) = delete;
+
+    ~NodePool()
+    {
+        for (char* slab : slabs) {
+            delete[] slab;
+        }
+    }
+
+private:
+    struct FreeBlock
+    {
+        FreeBlock* next;
+    };
+
+    struct SizeClass
+    {
+        size_t     bytes;
+        FreeBlock* freeList;
+        char*      slabCursor;
+        char*      slabEnd;
+    };
+
+    static const size_t slabBytes = 1 << 20;
+
+    static size_t roundUp(size_t bytes)
+    {
+        const size_t alignment = alignof(max_align_t);
+        return (max(bytes, sizeof(FreeBlock)) + alignment - 1) / alignment *
+               alignment;
+    }
+
+    static NodePool& threadPool()
+    {
+        static thread_local NodePool pool;
+        return pool;
+    }
+
+    SizeClass& sizeClass(size_t bytes)
+    {
+        // a search allocates one or two node sizes, a scan beats a map
+        for (auto& sc : sizeClasses) {
+            if (sc.bytes == bytes) {
+                return sc;
+            }
+        }
+
+        sizeClasses.push_back(SizeClass{bytes, nullptr, nullptr, nullptr});
+        return sizeClasses.back();
+    }
+
+    void* take(size_t bytes)
+    {
+        SizeClass& sc = sizeClass(bytes);
+
+        if (sc.freeList != nullptr) {
+            FreeBlock* block = sc.freeList;
+            sc.freeList      = block->next;
+            return block;
+        }
+
+        if (sc.slabCursor == nullptr ||
+            static_cast<size_t>(sc.slabEnd - sc.slabCursor) < bytes) {
+            size_t size = bytes > slabBytes ? bytes : slabBytes;
+            slabs.push_back(new char[size]);
+            sc.slabCursor = slabs.back();
+            sc.slabEnd    = sc.slabCursor + size;
+        }
+
+        void* block = sc.slabCursor;
+        sc.slabCursor += bytes;
+        return block;
+    }
+
+    void give(void* block, size_t bytes)
+    {
+        SizeClass& sc = sizeClass(bytes);
+
+        FreeBlock* freeBlock = static_cast<FreeBlock*>(block);
+        freeBlock->next      = sc.freeList;
+        sc.freeList          = freeBlock;
+    }
+
+    vector<SizeClass> sizeClasses;
+    vector<char*>     slabs;
+};
+
+template<class T>
+class NodePoolAllocator
+{
+public:
+    typedef T value_type;
+
+    NodePoolAllocator() noexcept {}
+
+    template<class U>
+    NodePoolAllocator(const NodePoolAllocator<U>&) noexcept
+    {
+    }
+
+    T* allocate(size_t n)
+    {
+        return static_cast<T*>(NodePool::allocate(n * sizeof(T)));
+    }
+
+    void deallocate(T* p, size_t n) noexcept
+    {
+        NodePool::deallocate(p, n * sizeof(T));
+    }
+};
+
+template<class T, class U>
+bool operator==(const NodePoolAllocator<T>&, const NodePoolAllocator<U>&)
+{
+    return true;
+}
+
+template<class T, class U>
+bool operator!=(const NodePoolAllocator<T>&, const NodePoolAllocator<U>&)
+{
+    return false;
+}
+
+// make_shared, or allocate_shared from the pool with USE_NODE_POOL
+template<class Node, class... Args>
+shared_ptr<Node> makeNode(Args&&... args)
+{
+#ifdef USE_NODE_POOL
+    return allocate_shared<Node>(NodePoolAllocator<Node>(),
+                                 forward<Args>(args)...);
+#else
+    return make_shared<Node>(forward<Args>(args)...);
+#endif
+}
@@ -164,6 +164,8 @@ public:
         while (!c.empty()) {
             c.pop_back();
         }
+
+        item2index.clear();
     }
 
     typename vector<T>::iterator begin() { return c.begin(); }
@@ -0,0 +1,192 @@
+#pragma once
+#include "ResultContainer.h"
+#include <cstdint>
+#include <ostream>
+#include <string>
+#include <unordered_map>
+#include <vector>
+
+using namespace std;
+
+// Binary visualization file, little endian, every section 4 byte aligned so
+// a reader can memory map it (see script/plot/visReader.py):
+//
+//   header      char magic[4] = "RTV1", uint32 version,
+//               uint32 numStates, stringBytes,
+//               uint32 numPaths, pathBytes, pathIds,
+//               uint32 numVisited, visitedBytes, visitedIds,
+//               uint32 numCommitted, committedBytes, committedIds,
+//               uint32 numKeepThinking
+//   states      char bytes[stringBytes], every state terminated by '\0'
+//   path        uint32 offsets[numPaths + 1], uint8 ids[pathBytes]
+//   visited     uint32 offsets[numVisited + 1], uint8 ids[visitedBytes]
+//   committed   uint32 offsets[numCommitted + 1], uint8 ids[committedBytes]
+//   keepThinking uint8 flags[(numKeepThinking + 7) / 8], one bit per flag,
+//               least significant bit first
+//
+// a state is its index in the string table, in order of first occurrence.
+// ids are delta encoded per iteration: the first id of an iteration is
+// relative to 0, the others to the previous id of the same iteration. every
+// delta is zigzag mapped to unsigned and written as a varint, 7 bits per
+// byte with the high bit set on all but the last byte; the offsets of an
+// iteration are byte offsets into the varints.
+class VisWriter
+{
+public:
+    static const uint32_t version = 2;
+
+    // sections are written to out as they are produced, only the string
+    // table and the varints of the list being written are kept in memory,
+    // because the header and the offsets need their sizes up front
+    void write(const ResultContainer& res, ostream& out)
+    {
+        sink    = &out;
+        written = 0;
+        stateIds.clear();
+        states.clear();
+
+        internStates(res.paths);
+        internStates(res.visited);
+        internStates(res.committed);
+
+        uint32_t stringBytes = 0;
+        for (const auto& s : states) {
+            stringBytes += static_cast<uint32_t>(s.size()) + 1;
+        }
+
+        const vector<vector<string>>* lists[] = {&res.paths, &res.visited,
+                                                 &res.committed};
+
+        const char magic[4] = {'R', 'T', 'V', '1'};
+        putBytes(magic, sizeof(magic));
+        putUint32(version);
+        putUint32(static_cast<uint32_t>(states.size()));
+        putUint32(stringBytes);
+        for (const auto* iterations : lists) {
+            putUint32(static_cast<uint32_t>(iterations->size()));
+            putUint32(encodedBytes(*iterations));
+            putUint32(totalStates(*iterations));
+        }
+        putUint32(static_cast<uint32_t>(res.isKeepThinkingFlags.size()));
+
+        for (const auto& s : states) {
+            putBytes(s.c_str(), s.size() + 1);
+        }
+        pad();
+
+        for (const auto* iterations : lists) {
+            putIterations(*iterations);
+        }
+
+        char flags = 0;
+        for (size_t i = 0; i < res.isKeepThinkingFlags.size(); ++i) {
+            if (res.isKeepThinkingFlags[i]) {
+                flags = static_cast<char>(flags | (1 << (i % 8)));
+            }
+            if (i % 8 == 7) {
+                putBytes(&flags, 1);
+                flags = 0;
+            }
+        }
+        if (res.isKeepThinkingFlags.size() % 8 != 0) {
+            putBytes(&flags, 1);
+        }
+        pad();
+
+        sink = nullptr;
+    }
+
+private:
+    void internStates(const vector<vector<string>>& iterations)
+    {
+        for (const auto& iteration : iterations) {
+            for (const auto& state : iteration) {
+                if (stateIds.find(state) == stateIds.end()) {
+                    stateIds.emplace(state,
+                                     static_cast<uint32_t>(states.size()));
+                    states.push_back(state);
+                }
+            }
+        }
+    }
+
+    static uint32_t totalStates(const vector<vector<string>>& iterations)
+    {
+        size_t total = 0;
+        for (const auto& iteration : iterations) {
+            total += iteration.size();
+        }
+        return static_cast<uint32_t>(total);
+    }
+
+    uint32_t encodedBytes(const vector<vector<string>>& iterations)
+    {
+        encoded.clear();
+        for (const auto& iteration : iterations) {
+            encodeIteration(iteration);
+        }
+        return static_cast<uint32_t>(encoded.size());
+    }
+
+    void encodeIteration(const vector<string>& iteration)
+    {
+        int64_t previous = 0;
+        for (const auto& state : iteration) {
+            const int64_t id    = stateIds.at(state);
+            const int64_t delta = id - previous;
+            previous            = id;
+
+            // zigzag: 0, -1, 1, -2, ... become 0, 1, 2, 3, ...
+            uint64_t value = delta < 0
+                               ? (static_cast<uint64_t>(-(delta + 1)) << 1) | 1
+                               : static_cast<uint64_t>(delta) << 1;
+            while (value >= 0x80) {
+                encoded.push_back(static_cast<char>((value & 0x7f) | 0x80));
+                value >>= 7;
+            }
+            encoded.push_back(static_cast<char>(value));
+        }
+    }
+
+    void putIterations(const vector<vector<string>>& iterations)
+    {
+        encoded.clear();
+        putUint32(0);
+        for (const auto& iteration : iterations) {
+            encodeIteration(iteration);
+            putUint32(static_cast<uint32_t>(encoded.size()));
+        }
+
+        putBytes(encoded.data(), encoded.size());
+        pad();
+    }
+
+    void putBytes(const char* bytes, size_t size)
+    {
+        sink->write(bytes, static_cast<streamsize>(size));
+        written += size;
+    }
+
+    void putUint32(uint32_t value)
+    {
+        char bytes[4];
+        for (int i = 0; i < 4; ++i) {
+            bytes[i] = static_cast<char>((value >> (8 * i)) & 0xff);
+        }
+        putBytes(bytes, sizeof(bytes));
+    }
+
+    void pad()
+    {
+        const char zeros[4] = {0, 0, 0, 0};
+        if (written % 4 != 0) {
+            putBytes(zeros, 4 - written % 4);
+        }
+    }
+
+    ostream*                        sink    = nullptr;
+    uint64_t                        written = 0;
+    unordered_map<string, uint32_t> stateIds;
+    vector<string>                  states;
+    vector<char>                    encoded;
+};